@@ -0,0 +1,122 @@
+"""Restart of taskmaster with a state file: adoption vs a cold start.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_adoption --programs 100
+
+A first manager starts every program then detaches, a second one started
+with the same state file must adopt every instance with its pid unchanged,
+restart the one program whose command changed and stop the removed one.
+Killing an adopted process must still be detected and restarted. Exits
+with 1 when any of that does not hold.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from benchmarks.common import (
+    make_logger,
+    make_program,
+    quiet,
+    raise_open_files_limit,
+    wait_for,
+    write_config,
+)
+from server.process import RUNNING
+from server.process_manager import ProcessManager
+from server.proc_sampler import read_start_time
+
+
+def all_running(manager, skip=()):
+    return all(
+        process_controller.state == RUNNING and process_controller.is_active()
+        for program_name, process_list in manager.processes.items()
+        if program_name not in skip
+        for process_controller in process_list
+    )
+
+
+def pids(manager):
+    return {
+        process_controller.name: process_controller.process.pid
+        for process_list in manager.processes.values()
+        for process_controller in process_list
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--programs", type=int, default=100)
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    results = {"unit": "s", "programs": args.programs}
+    failures = []
+    with tempfile.TemporaryDirectory() as directory, quiet():
+        programs = {
+            f"program_{idx}": make_program("sleep 1000")
+            for idx in range(args.programs)
+        }
+        programs["removed"] = make_program("sleep 1000")
+        config_path = write_config(programs, directory)
+        state_file = os.path.join(directory, "state.json")
+        logger = make_logger(directory)
+
+        start = time.perf_counter()
+        first = ProcessManager(config_path, logger, state_file=state_file)
+        if len(first.processes) != len(programs):
+            sys.exit("Failed: the configuration was not loaded")
+        wait_for(lambda: all_running(first))
+        results["cold_start"] = time.perf_counter() - start
+        before = pids(first)
+        first.detach()
+        results["state_file_bytes"] = os.path.getsize(state_file)
+
+        del programs["removed"]
+        programs["program_0"]["cmd"] = "sleep 1001"
+        config_path = write_config(programs, directory, name="changed.yaml")
+        start = time.perf_counter()
+        second = ProcessManager(config_path, logger, state_file=state_file)
+        try:
+            wait_for(lambda: all_running(second, skip=("program_0",)))
+            results["adopting_start"] = time.perf_counter() - start
+            # The changed program goes through its start window again
+            wait_for(lambda: all_running(second))
+            after = pids(second)
+            kept = [name for name in after if after[name] == before[name]]
+            results["adopted"] = len(kept)
+            if len(kept) != args.programs - 1 or "program_0" in kept:
+                failures.append(f"{len(kept)} instances adopted")
+            if read_start_time(before["removed"]) is not None:
+                time.sleep(0.5)
+                if read_start_time(before["removed"]) is not None:
+                    failures.append("removed program still running")
+
+            controller = second.processes["program_1"][0]
+            pid = controller.process.pid
+            start = time.perf_counter()
+            os.kill(pid, signal.SIGKILL)
+            wait_for(lambda: controller.process.pid != pid and controller.is_active())
+            results["adopted_crash_to_restart"] = time.perf_counter() - start
+        except TimeoutError as e:
+            failures.append(f"timed out: {e}")
+        finally:
+            second.stop_all()
+            second.close()
+            with open(state_file) as state:
+                if json.load(state)["programs"]:
+                    failures.append("state file not emptied by stop_all")
+
+    results["failures"] = failures
+    print(json.dumps(results, indent=4))
+    if failures:
+        print(f"Failed: {'; '.join(failures)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
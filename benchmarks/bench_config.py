@@ -0,0 +1,88 @@
+"""Config load and reload cost for a configuration with thousands of programs.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_config --programs 5000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import yaml
+
+from benchmarks.common import make_logger, make_program, quiet, write_config
+from server.config import Config
+from server.process_manager import ProcessManager
+
+
+def timed(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def cold_load(config_path):
+    Config._cache.clear()
+    Config(config_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--programs", type=int, default=5000)
+    args = parser.parse_args()
+
+    programs = {
+        f"program_{idx}": make_program(f"sleep {idx}", autostart=False)
+        for idx in range(args.programs)
+    }
+    results = {"unit": "ms", "programs": args.programs}
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = write_config(programs, directory)
+
+        default_loader = Config.loader
+        Config.loader = yaml.SafeLoader
+        results["cold_load_python_loader"] = timed(lambda: cold_load(config_path))
+        Config.loader = default_loader
+        results["cold_load"] = timed(lambda: cold_load(config_path))
+
+        Config(config_path)
+        results["reload_unchanged"] = timed(lambda: Config(config_path))
+
+        def touch_and_load():
+            os.utime(config_path)
+            Config(config_path)
+
+        results["reload_touched_same_content"] = timed(touch_and_load)
+
+        with open(config_path) as config_file:
+            content = config_file.read()
+        versions = [content, content.replace("cmd: sleep 0\n", "cmd: sleep 1\n", 1)]
+
+        def change_one_and_load():
+            # Alternate between two versions that differ by one program
+            versions.reverse()
+            with open(config_path, "w") as config_file:
+                config_file.write(versions[0])
+            Config(config_path)
+
+        results["reload_one_program_changed"] = timed(change_one_and_load)
+
+        logger = make_logger(directory)
+        with quiet():
+            manager = ProcessManager(config_path, logger)
+            results["manager_reload_unchanged"] = timed(manager.reload_configuration)
+            results["manager_reload_one_program_changed"] = timed(
+                lambda: (change_one_and_load(), manager.reload_configuration())
+            )
+            manager.close()
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Crash-to-restart latency: event-driven reaper vs the former 1 second poll loop.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_crash_restart --iterations 5
+"""
+import argparse
+import json
+import os
+import signal
+import tempfile
+import time
+
+from benchmarks.common import (
+    make_logger,
+    make_program,
+    quiet,
+    summarize,
+    wait_for,
+    write_config,
+)
+from server.process_manager import ProcessManager
+
+
+def measure(config_path, logger, iterations, poll_interval):
+    manager = ProcessManager(config_path, logger, poll_interval=poll_interval)
+    controller = manager.processes["crasher"][0]
+    samples = []
+    try:
+        for _ in range(iterations):
+            wait_for(lambda: controller.monitor and controller.is_active())
+            pid = controller.process.pid
+            start = time.perf_counter()
+            os.kill(pid, signal.SIGKILL)
+            wait_for(lambda: controller.process.pid != pid)
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        manager.stop_all()
+        manager.close()
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = write_config(
+            {
+                # A tiny window makes every kill the first crash, restarted at
+                # once, so the backoff does not hide the detection latency
+                "crasher": make_program(
+                    "sleep 1000", autorestart="always", crash_window=0.001
+                )
+            },
+            directory,
+        )
+        logger = make_logger(directory)
+        with quiet():
+            results = {
+                "unit": "ms",
+                "event_driven": measure(config_path, logger, args.iterations, None),
+                "poll_1s": measure(config_path, logger, args.iterations, 1),
+            }
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
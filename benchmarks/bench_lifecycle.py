@@ -0,0 +1,129 @@
+"""Process lifecycle costs of ProcessManager with N generated programs.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_lifecycle --programs 100
+
+Most programs run `sleep`, some exit at once with `true` and some crash in a
+loop. Measures cold start_all, crash to restart latency, daemon CPU and RSS
+at idle, reload with a small and a large diff, then stop_all.
+"""
+import argparse
+import json
+import os
+import resource
+import signal
+import tempfile
+import time
+
+from benchmarks.common import (
+    make_logger,
+    make_program,
+    quiet,
+    raise_open_files_limit,
+    rss_kb,
+    summarize,
+    wait_for,
+    write_config,
+)
+from server.process_manager import ProcessManager
+
+
+def generate_programs(count, version=0):
+    programs = {}
+    for idx in range(count):
+        if idx % 10 == 8:
+            cmd, overrides = "true", {"autorestart": "never"}
+        elif idx % 10 == 9:
+            # Survives the start window then crashes, forever
+            cmd, overrides = "sh -c 'sleep 1.5; exit 3'", {"crash_limit": 0}
+        else:
+            cmd, overrides = f"sleep {1000 + version}", {}
+        programs[f"program_{idx}"] = make_program(cmd, autostart=False, **overrides)
+    # Restarted at once after each kill, so only the detection is measured
+    programs["crasher"] = make_program(
+        "sleep 1000", autostart=False, autorestart="always", crash_window=0.001
+    )
+    return programs
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def crash_to_restart(controller, iterations):
+    samples = []
+    for _ in range(iterations):
+        wait_for(lambda: controller.monitor and controller.is_active())
+        pid = controller.process.pid
+        start = time.perf_counter()
+        os.kill(pid, signal.SIGKILL)
+        wait_for(lambda: controller.process.pid != pid)
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def idle_usage(seconds):
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    time.sleep(seconds)
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return {
+        "seconds": seconds,
+        "cpu_percent": round(cpu / seconds * 100, 2),
+        "rss_kb": rss_kb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--programs", type=int, default=100)
+    parser.add_argument("--crash-iterations", type=int, default=5)
+    parser.add_argument("--idle-seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    results = {"unit": "s", "programs": args.programs}
+    with tempfile.TemporaryDirectory() as directory, quiet():
+        programs = generate_programs(args.programs)
+        config_path = write_config(programs, directory)
+        manager = ProcessManager(config_path, make_logger(directory))
+        try:
+            results["start_all"], started = timed(manager.start_all)
+            results["started"] = sum(started.values())
+            results["crash_to_restart_ms"] = crash_to_restart(
+                manager.processes["crasher"][0], args.crash_iterations
+            )
+            results["idle"] = idle_usage(args.idle_seconds)
+
+            # One restart and one live change
+            programs["program_0"]["cmd"] = "sleep 1001"
+            programs["program_1"]["stoptime"] = 2
+            small_path = write_config(programs, directory, name="small.yaml")
+            results["reload_small"], _ = timed(
+                lambda: manager.reload_configuration(small_path)
+            )
+
+            # Half the programs restarted, a tenth removed and a tenth added
+            programs = generate_programs(args.programs, version=1)
+            for idx in range(0, args.programs, 2):
+                programs[f"program_{idx}"]["cmd"] = "sleep 1002"
+            for idx in range(args.programs // 10):
+                del programs[f"program_{idx * 10 + 1}"]
+                programs[f"added_{idx}"] = make_program("sleep 1000")
+            large_path = write_config(programs, directory, name="large.yaml")
+            results["reload_large"], _ = timed(
+                lambda: manager.reload_configuration(large_path)
+            )
+
+            results["stop_all"], _ = timed(manager.stop_all)
+        finally:
+            manager.stop_all()
+            manager.close()
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Per-call cost of the logger in foreground and daemon mode.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_logging --calls 100000
+"""
+import argparse
+import json
+import logging
+import tempfile
+import timeit
+
+from benchmarks.common import quiet
+from server.logger import Logger
+
+
+def per_call(statement, calls):
+    # Best of three, in microseconds per call
+    return min(timeit.repeat(statement, number=calls, repeat=3)) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100000)
+    args = parser.parse_args()
+
+    results = {"unit": "us/call", "calls": args.calls}
+    with tempfile.TemporaryDirectory() as directory, quiet():
+        logger = Logger(
+            "TaskMasterBenchLogging",
+            log_file=f"{directory}/taskmaster.log",
+            log_level="INFO",
+        )
+        name, pid = "program_1", 4242
+
+        results["debug_disabled_fstring"] = per_call(
+            lambda: logger.debug(f"Process '{name}' exited with pid {pid}"), args.calls
+        )
+        results["debug_disabled_lazy"] = per_call(
+            lambda: logger.debug("Process '%s' exited with pid %s", name, pid),
+            args.calls,
+        )
+
+        logger.console_enabled = True
+        results["info_foreground"] = per_call(
+            lambda: logger.info("Process '%s' started successfully", name), args.calls
+        )
+        logger.console_enabled = False
+        results["info_daemon"] = per_call(
+            lambda: logger.info("Process '%s' started successfully", name), args.calls
+        )
+
+        # The raw stdlib logger through the same queue, for reference
+        results["stdlib_info"] = per_call(
+            lambda: logger.logger.log(
+                logging.INFO, "Process '%s' started successfully", name
+            ),
+            args.calls,
+        )
+        stats = logger.stats()
+        logger.stop_listener()
+    results["dropped"] = stats["dropped"]
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Time to RUNNING with the starttime window vs a readiness probe, and time
+for a liveness probe to restart a hung instance.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_probes --programs 50 --ready-after 0.2
+
+Every program becomes ready --ready-after seconds after its spawn by creating
+a file. With the start window start_all waits starttime (1 s, its minimum)
+whatever the program does, with a file readiness probe it returns as soon as
+every file exists, all probes running concurrently on the loop. Then the
+liveness file of one instance is removed and the time until it is restarted
+is measured. Exits with 1 when a program does not become ready.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.common import (
+    make_logger,
+    make_program,
+    quiet,
+    raise_open_files_limit,
+    wait_for,
+    write_config,
+)
+from server.process import RUNNING
+from server.process_manager import ProcessManager
+
+PROBE_INTERVAL = 0.05
+
+
+def make_programs(directory, count, ready_after, probes):
+    programs = {}
+    for idx in range(count):
+        name = f"program_{idx}"
+        touch = f"touch {name}.ready {name}.alive"
+        program = make_program(
+            f"sh -c 'sleep {ready_after}; {touch}; exec sleep 1000'",
+            workingdir=directory,
+            autostart=False,
+            crash_limit=0,
+        )
+        if probes:
+            program["readiness"] = {"file": f"{name}.ready", "interval": PROBE_INTERVAL}
+            program["liveness"] = {
+                "file": f"{name}.alive",
+                "interval": PROBE_INTERVAL,
+                "failures": 1,
+            }
+        programs[name] = program
+    return programs
+
+
+def measure(directory, label, args, probes):
+    path = os.path.join(directory, label)
+    os.mkdir(path)
+    programs = make_programs(path, args.programs, args.ready_after, probes)
+    config_path = write_config(programs, directory, name=f"{label}.yaml")
+    manager = ProcessManager(config_path, make_logger(directory))
+    result = {}
+    try:
+        start = time.perf_counter()
+        manager.start_all()
+        result["start_all"] = time.perf_counter() - start
+        if not all(
+            process_list[0].state == RUNNING
+            for process_list in manager.processes.values()
+        ):
+            raise TimeoutError("a program did not become ready")
+        if probes:
+            controller = manager.processes["program_0"][0]
+            pid = controller.process.pid
+            start = time.perf_counter()
+            os.unlink(os.path.join(path, "program_0.alive"))
+            wait_for(lambda: controller.process.pid != pid)
+            result["liveness_failure_to_restart"] = time.perf_counter() - start
+    finally:
+        manager.stop_all()
+        manager.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--programs", type=int, default=50)
+    parser.add_argument("--ready-after", type=float, default=0.2)
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    results = {"unit": "s", "programs": args.programs, "ready_after": args.ready_after}
+    failure = None
+    with tempfile.TemporaryDirectory() as directory, quiet():
+        try:
+            results["starttime"] = measure(directory, "starttime", args, False)
+            results["readiness"] = measure(directory, "readiness", args, True)
+        except TimeoutError as e:
+            failure = f"timed out: {e}"
+    print(json.dumps(results, indent=4))
+    if failure:
+        print(f"Failed: {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Cost of one /proc sampling pass over 1k running processes.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_sampler --processes 1000 --passes 20
+"""
+import argparse
+import json
+import subprocess
+
+from benchmarks.common import summarize
+from server.proc_sampler import ProcessSampler
+
+
+class Controller:
+    """The sampler only needs the process of each controller"""
+
+    def __init__(self, process):
+        self.process = process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=1000)
+    parser.add_argument("--passes", type=int, default=20)
+    args = parser.parse_args()
+
+    processes = [
+        subprocess.Popen(["sleep", "1000"], stdin=subprocess.DEVNULL)
+        for _ in range(args.processes)
+    ]
+    try:
+        controllers = [Controller(process) for process in processes]
+        sampler = ProcessSampler(event_loop=None, get_controllers=None)
+        durations = []
+        for _ in range(args.passes):
+            sampler.sample(controllers)
+            durations.append(sampler.last_pass_duration * 1000)
+        sample = sampler.histories[controllers[0]].samples[-1]
+    finally:
+        for process in processes:
+            process.kill()
+        for process in processes:
+            process.wait()
+    results = {
+        "unit": "ms",
+        "processes": args.processes,
+        "pass": summarize(durations),
+        "example_sample": sample,
+    }
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
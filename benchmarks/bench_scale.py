@@ -0,0 +1,82 @@
+"""Manager memory and latency with 1k and 10k instances of a single program.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_scale --sizes 1000 10000 [--spawn]
+
+Without --spawn only the in-memory representation is measured. With --spawn
+every instance runs `sleep`, which needs enough pids and open files.
+"""
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import (
+    make_logger,
+    make_program,
+    quiet,
+    raise_open_files_limit,
+    rss_kb,
+    write_config,
+)
+from server.process_manager import ProcessManager
+
+
+def measure(size, directory, logger, spawn):
+    config_path = write_config(
+        {"worker": make_program("sleep 1000", numprocs=size, autostart=False)},
+        directory,
+        name=f"scale_{size}.yaml",
+    )
+    tracemalloc.start()
+    start = time.perf_counter()
+    manager = ProcessManager(config_path, logger)
+    load_ms = (time.perf_counter() - start) * 1000
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    controllers = manager.processes["worker"]
+    start = time.perf_counter()
+    for process_controller in controllers:
+        process_controller.status()
+    results = {
+        "instances": len(controllers),
+        "load_ms": load_ms,
+        "manager_bytes": memory,
+        "bytes_per_instance": memory // size,
+        "status_scan_ms": (time.perf_counter() - start) * 1000,
+    }
+    if spawn:
+        start = time.perf_counter()
+        started = manager.start_all()
+        results["start_all_s"] = time.perf_counter() - start
+        results["started"] = sum(started.values())
+        results["daemon_rss_kb"] = rss_kb()
+        start = time.perf_counter()
+        manager.stop_all()
+        results["stop_all_s"] = time.perf_counter() - start
+    manager.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--spawn", action="store_true")
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    with tempfile.TemporaryDirectory() as directory:
+        logger = make_logger(directory)
+        with quiet():
+            results = {
+                str(size): measure(size, directory, logger, args.spawn)
+                for size in args.sizes
+            }
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
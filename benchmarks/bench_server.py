@@ -0,0 +1,101 @@
+"""Control server throughput and latency with many concurrent connections.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_server --connections 1000 --requests 5
+"""
+import argparse
+import asyncio
+import json
+import socket
+import tempfile
+import threading
+import time
+
+from benchmarks.common import (
+    make_logger,
+    make_program,
+    quiet,
+    raise_open_files_limit,
+    summarize,
+    write_config,
+)
+from server.process_manager import ProcessManager
+from server.server import TaskMasterServer
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+async def connect(port):
+    for _ in range(100):
+        try:
+            return await asyncio.open_connection("localhost", port)
+        except ConnectionRefusedError:
+            await asyncio.sleep(0.05)
+    raise ConnectionRefusedError(f"server not listening on {port}")
+
+
+async def run_client(port, requests, command, latencies):
+    reader, writer = await connect(port)
+    for request_id in range(requests):
+        start = time.perf_counter()
+        writer.write(json.dumps({"id": request_id, "command": command}).encode() + b"\n")
+        reply = json.loads(await reader.readline())
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert reply["ok"] and reply["id"] == request_id, reply
+    writer.close()
+
+
+async def run_load(port, connections, requests, command):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(run_client(port, requests, command, latencies) for _ in range(connections))
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "connections": connections,
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / elapsed,
+        "latency_ms": summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--command", default="status")
+    args = parser.parse_args()
+
+    raise_open_files_limit()
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = write_config(
+            {"sleeper": make_program("sleep 1000", numprocs=4)}, directory
+        )
+        logger = make_logger(directory)
+        with quiet():
+            manager = ProcessManager(config_path, logger)
+            server = TaskMasterServer(manager, logger, port=port)
+            thread = threading.Thread(target=server.start, daemon=True)
+            thread.start()
+            results = {
+                "single": asyncio.run(run_load(port, 1, 200, args.command)),
+                "concurrent": asyncio.run(
+                    run_load(port, args.connections, args.requests, args.command)
+                ),
+            }
+            server.stop()
+            thread.join(timeout=5)
+            manager.stop_all()
+            manager.close()
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Spawn rate with a large daemon RSS: preexec_fn vs the current spawn path.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_spawn --spawns 200 --rss-mb 1024
+
+The daemon memory is grown with a ballast first. A preexec_fn makes CPython
+fork and copy the page tables of the whole daemon for every spawn, the
+current path lets it use vfork so the cost no longer grows with the RSS.
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+from benchmarks.common import make_logger, make_program, quiet, rss_kb, write_config
+from server.metrics import metrics
+from server.process_manager import ProcessManager
+
+PAGE_SIZE = 4096
+
+
+def make_ballast(megabytes):
+    ballast = bytearray(megabytes * 1024 * 1024)
+    # Touch every page so that it is really resident
+    ballast[::PAGE_SIZE] = b"\x01" * (len(ballast) // PAGE_SIZE)
+    return ballast
+
+
+def legacy_spawns(count):
+    """The former spawn: environ copied each time and a Python preexec_fn"""
+
+    def initproc():
+        os.umask(0o022)
+        os.close(0)
+
+    elapsed = 0.0
+    for _ in range(count):
+        start = time.perf_counter()
+        env = os.environ.copy()
+        process = subprocess.Popen(
+            ["true"], env=env, preexec_fn=initproc, stdout=subprocess.DEVNULL
+        )
+        elapsed += time.perf_counter() - start
+        process.wait()
+    return elapsed / count
+
+
+def current_spawns(manager, program_name):
+    """Mean time ProcessController spent in Popen, from the spawn histogram"""
+    series = metrics.spawn_duration.values[(program_name,)]
+    manager.start_all()
+    return series[-1] / sum(series[:-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spawns", type=int, default=200)
+    parser.add_argument("--rss-mb", type=int, default=1024)
+    args = parser.parse_args()
+
+    results = {"unit": "ms/spawn", "spawns": args.spawns}
+    with tempfile.TemporaryDirectory() as directory, quiet():
+        programs = {
+            "spawner": make_program(
+                "true", numprocs=args.spawns, autostart=False, autorestart="never"
+            )
+        }
+        config_path = write_config(programs, directory)
+        manager = ProcessManager(config_path, make_logger(directory))
+        try:
+            for label, megabytes in (("small_rss", 0), ("large_rss", args.rss_mb)):
+                ballast = make_ballast(megabytes)
+                metrics.spawn_duration.values.pop(("spawner",), None)
+                # The series is created on the first observation
+                manager.processes["spawner"][0].start().result()
+                results[label] = {
+                    "rss_kb": rss_kb(),
+                    "preexec_fn": legacy_spawns(args.spawns) * 1000,
+                    "current": current_spawns(manager, "spawner") * 1000,
+                }
+                del ballast
+        finally:
+            manager.stop_all()
+            manager.close()
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Control command round-trip time over TCP and over the Unix domain socket.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_transport --requests 500
+
+Requests are sent one at a time like the client does: on one kept
+connection, and with a new connection per request like a health check.
+"""
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from benchmarks.common import make_logger, make_program, quiet, summarize, write_config
+from benchmarks.bench_server import free_port
+from client.client import encode_request
+from server.process_manager import ProcessManager
+from server.server import TaskMasterServer
+
+
+def connect(address):
+    for _ in range(100):
+        try:
+            if isinstance(address, str):
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(address)
+                return sock
+            return socket.create_connection(address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            time.sleep(0.05)
+    raise ConnectionRefusedError(f"server not listening on {address}")
+
+
+def round_trip(sock_file, frame):
+    sock_file.write(encode_request(frame))
+    sock_file.flush()
+    reply = json.loads(sock_file.readline())
+    assert reply["ok"], reply
+
+
+def kept_connection(address, frame, requests):
+    latencies = []
+    with connect(address) as sock:
+        if sock.family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock_file = sock.makefile("rwb")
+        round_trip(sock_file, frame)
+        for _ in range(requests):
+            start = time.perf_counter()
+            round_trip(sock_file, frame)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    return summarize(latencies)
+
+
+def connection_per_request(address, frame, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        with connect(address) as sock:
+            round_trip(sock.makefile("rwb"), frame)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return summarize(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    results = {"unit": "us"}
+    frames = {
+        "query": {"id": 1, "query": "status"},
+        "command": {"id": 1, "command": "status"},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = write_config(
+            {"sleeper": make_program("sleep 1000", numprocs=4)}, directory
+        )
+        logger = make_logger(directory)
+        socket_path = os.path.join(directory, "taskmaster.sock")
+        port = free_port()
+        with quiet():
+            manager = ProcessManager(config_path, logger)
+            server = TaskMasterServer(
+                manager, logger, port=port, socket_path=socket_path
+            )
+            thread = threading.Thread(target=server.start, daemon=True)
+            thread.start()
+            for transport, address in (
+                ("tcp", ("localhost", port)),
+                ("unix", socket_path),
+            ):
+                for name, frame in frames.items():
+                    results[f"{transport}_{name}"] = kept_connection(
+                        address, frame, args.requests
+                    )
+                results[f"{transport}_connect_query"] = connection_per_request(
+                    address, frames["query"], args.requests
+                )
+            server.stop()
+            thread.join(timeout=5)
+            manager.stop_all()
+            manager.close()
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
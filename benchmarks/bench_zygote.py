@@ -0,0 +1,143 @@
+"""Start latency and memory of a program with heavy imports, with and without
+zygote mode.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_zygote --instances 10 --import-delay 0.3
+
+The generated program imports a module that takes --import-delay seconds and
+allocates --import-mb of data, then writes a marker file and sleeps. Each
+mode measures the time from start_all to every marker, the summed Pss of the
+instances (and of the template) and the time from a crash to the marker of
+the restarted instance. Exits with 1 when an instance does not come up.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+
+from benchmarks.common import make_logger, make_program, quiet, wait_for, write_config
+from server.process import RUNNING
+from server.process_manager import ProcessManager
+
+HEAVY_MODULE = """\
+import time
+
+time.sleep({delay})
+# Built once at import time and only read afterwards, like a loaded model
+TABLE = [str(i) * 10 for i in range({items})]
+"""
+
+WORKER_SCRIPT = """\
+import os
+import sys
+import time
+
+import heavy
+
+with open(os.path.join(sys.argv[1], f"ready-{{os.getpid()}}"), "w"):
+    pass
+time.sleep(1000)
+"""
+
+
+def pss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as rollup:
+            for line in rollup:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except (FileNotFoundError, ProcessLookupError):
+        pass
+    return 0
+
+
+def ready(markers, controllers):
+    return all(
+        process_controller.process is not None
+        and os.path.exists(
+            os.path.join(markers, f"ready-{process_controller.process.pid}")
+        )
+        for process_controller in controllers
+    )
+
+
+def measure(directory, label, zygote, args):
+    markers = os.path.join(directory, label)
+    os.mkdir(markers)
+    program = make_program(
+        f"{sys.executable} worker.py {markers}",
+        numprocs=args.instances,
+        workingdir=directory,
+        autostart=False,
+        autorestart="unexpected",
+        exitcodes=[0],
+    )
+    if zygote:
+        program.update(zygote=True, preload=["heavy"])
+    config_path = write_config({label: program}, directory, name=f"{label}.yaml")
+    manager = ProcessManager(config_path, make_logger(directory))
+    controllers = manager.processes[label]
+    result = {}
+    try:
+        start = time.perf_counter()
+        manager.start_all()
+        wait_for(lambda: ready(markers, controllers))
+        result["start_all_to_ready"] = time.perf_counter() - start
+        pids = [process_controller.process.pid for process_controller in controllers]
+        if zygote:
+            pids.append(manager.zygotes[label].process.pid)
+        result["pss_kb"] = sum(pss_kb(pid) for pid in pids)
+
+        samples = []
+        for process_controller in controllers[: args.crashes]:
+            wait_for(lambda: process_controller.state == RUNNING)
+            pid = process_controller.process.pid
+            start = time.perf_counter()
+            os.kill(pid, signal.SIGKILL)
+            wait_for(
+                lambda: process_controller.process.pid != pid
+                and ready(markers, [process_controller])
+            )
+            samples.append(time.perf_counter() - start)
+        result["crash_to_ready"] = sum(samples) / len(samples)
+    finally:
+        manager.stop_all()
+        manager.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--instances", type=int, default=10)
+    parser.add_argument("--import-delay", type=float, default=0.3)
+    parser.add_argument("--import-mb", type=int, default=20)
+    parser.add_argument("--crashes", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {"unit": "s", "instances": args.instances}
+    with tempfile.TemporaryDirectory() as directory, quiet():
+        with open(os.path.join(directory, "heavy.py"), "w") as heavy:
+            # About 80 bytes per item with the list slot
+            items = args.import_mb * 1024 * 1024 // 80
+            heavy.write(HEAVY_MODULE.format(delay=args.import_delay, items=items))
+        with open(os.path.join(directory, "worker.py"), "w") as worker:
+            worker.write(WORKER_SCRIPT.format())
+        try:
+            results["plain"] = measure(directory, "plain", False, args)
+            results["zygote"] = measure(directory, "zygote", True, args)
+        except TimeoutError as e:
+            failure = f"timed out: {e}"
+        else:
+            failure = None
+    print(json.dumps(results, indent=4))
+    if failure:
+        print(f"Failed: {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
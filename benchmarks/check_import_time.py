@@ -0,0 +1,100 @@
+"""Import time of the entry points against a budget, with -X importtime.
+
+Run from the repository root:
+
+    python -m benchmarks.check_import_time [--runs 5] [--scale 2]
+
+Each entry module is imported in a fresh interpreter, the best of the runs
+is kept. Exits with 1 when an entry point is over its budget or imports a
+module that only another mode needs.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# Module, budget in milliseconds, modules it must not import
+ENTRY_POINTS = {
+    "client": (
+        "client.client",
+        40,
+        ("server", "yaml", "asyncio", "readline", "smtplib", "email", "http"),
+    ),
+    "server": (
+        "server.main",
+        150,
+        (
+            "daemon",
+            "readline",
+            "cmd",
+            "smtplib",
+            "email",
+            "http",
+            "server.control_shell",
+            "server.server",
+            "server.mail",
+        ),
+    ),
+}
+
+
+def import_times(module):
+    """{module: cumulative microseconds} of one import in a new interpreter"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def forbidden_imports(imported, forbidden):
+    return sorted(
+        name
+        for name in imported
+        if any(name == prefix or name.startswith(prefix + ".") for prefix in forbidden)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=float, default=1, help="Multiply the budgets, for slow hosts"
+    )
+    args = parser.parse_args()
+
+    results = {"unit": "ms"}
+    failures = []
+    for name, (module, budget, forbidden) in ENTRY_POINTS.items():
+        runs = [import_times(module) for _ in range(args.runs)]
+        best = min(times[module] for times in runs) / 1000
+        budget *= args.scale
+        unexpected = forbidden_imports(runs[0], forbidden)
+        results[name] = {
+            "module": module,
+            "import_ms": round(best, 2),
+            "budget_ms": budget,
+            "modules": len(runs[0]),
+            "forbidden_imports": unexpected,
+        }
+        if best > budget:
+            failures.append(f"{module} imports in {best:.1f} ms, budget {budget} ms")
+        if unexpected:
+            failures.append(f"{module} imports {', '.join(unexpected)}")
+
+    print(json.dumps(results, indent=4))
+    if failures:
+        print(f"Failed: {'; '.join(failures)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
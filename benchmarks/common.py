@@ -0,0 +1,80 @@
+import contextlib
+import os
+import resource
+import statistics
+import time
+
+import yaml
+
+from server.logger import Logger
+
+PROGRAM_DEFAULTS = {
+    "numprocs": 1,
+    "umask": "0o022",
+    "workingdir": "/tmp",
+    "autostart": True,
+    "autorestart": "unexpected",
+    "exitcodes": [0],
+    "startretries": 1,
+    "starttime": 1,
+    "stopsignal": "SIGTERM",
+    "stoptime": 1,
+    "stdout": "null",
+    "stderr": "null",
+    "env": {},
+}
+
+
+def make_program(cmd, **overrides):
+    program = dict(PROGRAM_DEFAULTS, cmd=cmd)
+    program.update(overrides)
+    return program
+
+
+def write_config(programs, directory, name="config.yaml"):
+    path = os.path.join(directory, name)
+    with open(path, "w") as config_file:
+        yaml.safe_dump({"programs": programs}, config_file)
+    return path
+
+
+def make_logger(directory, name="TaskMasterBench"):
+    return Logger(
+        name, log_file=os.path.join(directory, "taskmaster.log"), log_level="WARNING"
+    )
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the logger console output while a benchmark runs"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max": samples[-1],
+    }
+
+
+def wait_for(predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not reached")
+        time.sleep(0.0005)
+
+
+def rss_kb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
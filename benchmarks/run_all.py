@@ -0,0 +1,95 @@
+"""Run every benchmark with quick settings and collect the results in one JSON.
+
+Run from the repository root:
+
+    python -m benchmarks.run_all --output results.json [--only lifecycle config]
+
+Each benchmark runs in its own interpreter so none of them inherits the
+processes, threads or memory of another. Everything is local, no network.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# Module name and the arguments used for a run of a few minutes at most
+BENCHMARKS = {
+    "lifecycle": ("benchmarks.bench_lifecycle", ["--programs", "100"]),
+    "crash_restart": ("benchmarks.bench_crash_restart", ["--iterations", "5"]),
+    "scale": ("benchmarks.bench_scale", ["--sizes", "1000"]),
+    "server": ("benchmarks.bench_server", ["--connections", "100"]),
+    "transport": ("benchmarks.bench_transport", ["--requests", "200"]),
+    "config": ("benchmarks.bench_config", ["--programs", "1000"]),
+    "logging": ("benchmarks.bench_logging", ["--calls", "20000"]),
+    "sampler": ("benchmarks.bench_sampler", ["--processes", "200"]),
+    "adoption": ("benchmarks.bench_adoption", ["--programs", "100"]),
+    "spawn": ("benchmarks.bench_spawn", ["--spawns", "100", "--rss-mb", "256"]),
+    "zygote": ("benchmarks.bench_zygote", ["--instances", "5"]),
+    "probes": ("benchmarks.bench_probes", ["--programs", "50"]),
+    "imports": ("benchmarks.check_import_time", ["--runs", "3"]),
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(module, arguments):
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-m", module, *arguments], capture_output=True, text=True
+    )
+    result = {"wall_s": round(time.perf_counter() - start, 3)}
+    if completed.returncode != 0:
+        result["error"] = completed.stderr.strip().splitlines()[-1:]
+    else:
+        result["results"] = json.loads(completed.stdout)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS))
+    parser.add_argument("--output", help="Write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": len(os.sched_getaffinity(0)),
+        "timestamp": int(time.time()),
+        "benchmarks": {},
+    }
+    for name in args.only or BENCHMARKS:
+        module, arguments = BENCHMARKS[name]
+        print(f"Running {name}...", file=sys.stderr)
+        report["benchmarks"][name] = run(module, arguments)
+
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    failed = [
+        name for name, result in report["benchmarks"].items() if "error" in result
+    ]
+    if failed:
+        print(f"Failed: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
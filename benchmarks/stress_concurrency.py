@@ -0,0 +1,170 @@
+"""Stress ProcessManager with concurrent start, stop, restart, reload and status.
+
+Run from the repository root:
+
+    python -m benchmarks.stress_concurrency --threads 8 --seconds 20
+
+Worker threads issue random commands the way the control server's threads
+and signal handlers do. Every command must return without an exception, and
+once everything is stopped the manager must match the last loaded config
+with no child left running. Exits with 1 and prints the failures otherwise.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.common import make_logger, make_program, quiet, write_config
+from server.process_manager import ProcessManager
+
+
+def generate_programs(count, variant):
+    """Two variants that differ in commands, numprocs and the set of programs"""
+    programs = {}
+    for idx in range(count):
+        if variant and idx % 4 == 3:
+            continue
+        programs[f"program_{idx}"] = make_program(
+            f"sleep {1000 + variant}",
+            numprocs=1 + (idx + variant) % 3,
+            starttime=1,
+            stoptime=1,
+        )
+    if variant:
+        programs["extra"] = make_program("sleep 1000", numprocs=2)
+    return programs
+
+
+def worker(manager, config_paths, deadline, seed, failures, counts):
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        program_name = rng.choice(list(manager.processes) or ["program_0"])
+        action = rng.choices(
+            ["start", "stop", "restart", "reload", "status", "query"],
+            weights=[4, 4, 2, 1, 2, 2],
+        )[0]
+        try:
+            if action == "start":
+                manager.start_process(program_name)
+            elif action == "stop":
+                manager.stop_process(program_name)
+            elif action == "restart":
+                manager.restart_process(program_name)
+            elif action == "reload":
+                manager.reload_configuration(rng.choice(config_paths))
+            elif action == "status":
+                manager.status()
+            else:
+                manager.query_status()
+        except Exception as e:
+            failures.append(f"{action} {program_name}: {type(e).__name__}: {e}")
+        counts[action] = counts.get(action, 0) + 1
+
+
+def running_children():
+    children = []
+    for task in os.listdir(f"/proc/{os.getpid()}/task"):
+        with open(f"/proc/{os.getpid()}/task/{task}/children") as children_file:
+            children.extend(children_file.read().split())
+    alive = []
+    for pid in children:
+        try:
+            with open(f"/proc/{pid}/stat") as stat_file:
+                if stat_file.read().rsplit(")", 1)[1].split()[0] != "Z":
+                    alive.append(int(pid))
+        except OSError:
+            pass
+    return alive
+
+
+def check(manager, programs):
+    problems = []
+    if sorted(manager.processes) != sorted(programs):
+        problems.append(
+            f"programs {sorted(manager.processes)} != config {sorted(programs)}"
+        )
+    for program_name, process_list in manager.processes.items():
+        expected = programs.get(program_name, {}).get("numprocs")
+        if len(process_list) != expected:
+            problems.append(
+                f"{program_name}: {len(process_list)} instances, want {expected}"
+            )
+        names = [process_controller.name for process_controller in process_list]
+        if len(set(names)) != len(names):
+            problems.append(f"{program_name}: duplicate instance names {names}")
+        for process_controller in process_list:
+            if process_controller.config is not process_list[0].config:
+                problems.append(f"{process_controller.name}: stale config")
+            if process_controller.is_active():
+                problems.append(f"{process_controller.name}: still running")
+    alive = running_children()
+    if alive:
+        problems.append(f"children still running after stop_all: {alive}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--programs", type=int, default=12)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--timeout", type=float, default=60, help="Grace for the last commands"
+    )
+    args = parser.parse_args()
+
+    failures = []
+    counts = [{} for _ in range(args.threads)]
+    with tempfile.TemporaryDirectory() as directory, quiet():
+        variants = [generate_programs(args.programs, variant) for variant in (0, 1)]
+        config_paths = [
+            write_config(programs, directory, name=f"variant_{idx}.yaml")
+            for idx, programs in enumerate(variants)
+        ]
+        manager = ProcessManager(config_paths[0], make_logger(directory))
+        deadline = time.monotonic() + args.seconds
+        threads = [
+            threading.Thread(
+                target=worker,
+                args=(
+                    manager,
+                    config_paths,
+                    deadline,
+                    args.seed + idx,
+                    failures,
+                    counts[idx],
+                ),
+            )
+            for idx in range(args.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=max(0, deadline - time.monotonic()) + args.timeout)
+        if any(thread.is_alive() for thread in threads):
+            # A command never returned, nothing sensible can be checked or stopped
+            print("Failed: commands still blocked, deadlock?", file=sys.stderr)
+            os._exit(1)
+
+        # The config last loaded decides what must be there
+        last = variants[config_paths.index(manager.config_path)]
+        manager.stop_all()
+        manager.close()
+        failures.extend(check(manager, last))
+
+    totals = {}
+    for thread_counts in counts:
+        for action, count in thread_counts.items():
+            totals[action] = totals.get(action, 0) + count
+    print(json.dumps({"commands": totals, "failures": failures}, indent=4))
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
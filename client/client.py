@@ -1,29 +1,214 @@
 import socket
 import argparse
+import collections
+import json
+import re
+import sys
+
+
+def encode_request(message):
+    return json.dumps(message).encode() + b"\n"
+
+
+def write_frame(sock_file, message):
+    sock_file.write(encode_request(message))
+    sock_file.flush()
+
+
+def read_reply(sock_file, request_id, on_stream=None):
+    """Read frames until the final reply to request_id, stream chunks go to on_stream"""
+    while True:
+        line = sock_file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the server")
+        frame = json.loads(line)
+        if "stream" in frame:
+            if on_stream is not None and frame.get("id") == request_id:
+                on_stream(frame)
+            continue
+        # Frames without an id answer the connection, e.g. a refused peer
+        if frame.get("id") == request_id or "id" not in frame:
+            return frame
+
+
+def send_command(sock_file, request_id, command, on_stream=None):
+    """Send one command frame and return the decoded reply frame"""
+    write_frame(sock_file, {"id": request_id, "command": command})
+    return read_reply(sock_file, request_id, on_stream)
+
+
+def display_stream(frame):
+    sys.stdout.write(frame["data"])
+    sys.stdout.flush()
+
+
+def follow(sock_file, request_id, command):
+    """Stream a tail -f command until Ctrl-C, then cancel it on the server"""
+    write_frame(sock_file, {"id": request_id, "command": command})
+    try:
+        return read_reply(sock_file, request_id, display_stream)
+    except KeyboardInterrupt:
+        write_frame(sock_file, {"cancel": request_id})
+        return read_reply(sock_file, request_id)
+
+
+# Commands answered with data when --json is given
+QUERIES = ("status", "config", "resources")
+BATCH_WINDOW = 64
+# Colors of the server log lines, only meant for a terminal
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+def build_request(request_id, command, as_json=False):
+    """Frame for one command line, a query frame for data commands in JSON mode"""
+    words = command.split()
+    if as_json and words and words[0] in QUERIES:
+        return {"id": request_id, "query": words[0], "programs": words[1:] or None}
+    return {"id": request_id, "command": command}
+
+
+def strip_colors(response):
+    return {
+        key: ANSI_ESCAPE.sub("", value) if isinstance(value, str) else value
+        for key, value in response.items()
+    }
+
+
+def display_response(response, as_json=False):
+    if as_json or not sys.stdout.isatty():
+        response = strip_colors(response)
+    if as_json:
+        print(json.dumps(response))
+    elif response.get("ok"):
+        print(response["output"])
+    else:
+        print(f"Error: {response.get('error')}")
+
+
+def run_batch(sock_file, commands, as_json=False, window=BATCH_WINDOW):
+    """Send commands pipelined over one connection and print the replies in order.
+
+    At most window requests are in flight, so neither side can block on a full
+    socket buffer. Returns True when every command succeeded.
+    """
+    pending = collections.deque()
+    succeeded = True
+    request_id = 0
+    for command in commands:
+        if command.split()[:2] == ["tail", "-f"]:
+            display_response({"ok": False, "error": "tail -f cannot be batched"}, as_json)
+            succeeded = False
+            continue
+        request_id += 1
+        sock_file.write(encode_request(build_request(request_id, command, as_json)))
+        pending.append(request_id)
+        if len(pending) >= window:
+            sock_file.flush()
+            response = read_reply(sock_file, pending.popleft())
+            succeeded = response.get("ok", False) and succeeded
+            display_response(response, as_json)
+    sock_file.flush()
+    while pending:
+        response = read_reply(sock_file, pending.popleft())
+        succeeded = response.get("ok", False) and succeeded
+        display_response(response, as_json)
+    return succeeded
+
+
+def read_commands(batch_file):
+    source = sys.stdin if batch_file == "-" else open(batch_file)
+    with source:
+        for line in source:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def interactive(sock_file):
+    print("Connected to TaskMaster server")
+    request_id = 0
+    while True:
+        user_input = input("(taskmaster) ")
+        if not user_input.strip():
+            continue
+        request_id += 1
+        if user_input.split()[:2] == ["tail", "-f"]:
+            response = follow(sock_file, request_id, user_input)
+        else:
+            response = send_command(sock_file, request_id, user_input)
+        display_response(response)
+        if user_input.split()[0] in ("quit", "exit"):
+            break
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="TaskMaster client",
+        epilog="Put -- before a command that has options, e.g. -- tail -f web",
+    )
+    parser.add_argument(
+        "--host", type=str, default="localhost", help="TaskMaster server host"
+    )
+    parser.add_argument("--port", type=int, default=9001, help="TaskMaster server port")
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="Connect to the Unix domain socket of the server instead of TCP",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print replies as JSON, status, config and resources return data",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        nargs="?",
+        const="-",
+        help="Send one command per line of FILE (default: stdin) over one connection",
+    )
+    parser.add_argument(
+        "command", nargs="*", help="Run this command and exit instead of a shell"
+    )
+    return parser.parse_args()
+
+
+def connect(args):
+    if args.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(args.socket)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return socket.create_connection((args.host, args.port))
 
 
 def client():
+    args = parse_args()
     try:
-        parser = argparse.ArgumentParser()
-        parser.add_argument(
-            "--host", type=str, default="localhost", help="TaskMaster server host"
-        )
-        parser.add_argument("--port", type=int, default=9001, help="TaskMaster server port")
-        args = parser.parse_args()
-
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.connect((args.host, args.port))
-            print("Connected to TaskMaster server")
-
-            while True:
-                user_input = input("(taskmaster) ")
-                s.sendall(user_input.encode())
-                data = s.recv(1024)
-                print(data.decode())
+        with connect(args) as s:
+            sock_file = s.makefile("rwb")
+            if args.batch is not None:
+                ok = run_batch(sock_file, read_commands(args.batch), args.json)
+                sys.exit(0 if ok else 1)
+            if args.command:
+                command = " ".join(args.command)
+                if args.command[:2] == ["tail", "-f"]:
+                    response = follow(sock_file, 1, command)
+                else:
+                    write_frame(sock_file, build_request(1, command, args.json))
+                    response = read_reply(sock_file, 1)
+                display_response(response, args.json)
+                sys.exit(0 if response.get("ok") else 1)
+            interactive(sock_file)
     except KeyboardInterrupt:
         print("\nExiting...")
     except Exception as e:
-        print(f"\nError: {e}")
+        print(f"\nError: {e}", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,22 @@
 import yaml
+import gc
+import hashlib
 import os
+import shlex
 import signal
+import urllib.parse
+
+from server.probes import PROBE_KINDS, parse_tcp_target
 
 
 class Config:
+    # libyaml is an order of magnitude faster than the pure Python loader
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+    # config_path -> (file stat key, content digest, raw data, validated data),
+    # shared so a reload only parses and validates what changed
+    _cache = {}
+
     def __init__(self, config_path):
         self.config_path = config_path
         self.load()
@@ -31,151 +44,337 @@ class Config:
             return
 
         for program_name, program in self.data["programs"].items():
-            if not isinstance(program, dict):
-                raise ValueError("The 'program' key must have a dictionary value")
+            self.validate_program(program_name, program)
 
-            # Validate mandatory fields
-            if "cmd" not in program:
-                raise ValueError(
-                    "Mandatory field 'cmd' is missing in the program configuration"
-                )
-            if "numprocs" not in program:
-                raise ValueError(
-                    "Mandatory field 'numprocs' is missing in the program configuration"
-                )
-            if "autostart" not in program:
-                raise ValueError(
-                    "Mandatory field 'autostart' is missing in the program configuration"
-                )
-            if "autorestart" not in program:
-                raise ValueError(
-                    "Mandatory field 'autorestart' is missing in the program configuration"
-                )
-            if "umask" not in program:
-                raise ValueError(
-                    "Mandatory field 'umask' is missing in the program configuration"
-                )
+    def validate_fields(self, program):
+        # Validate mandatory fields
+        if "cmd" not in program:
+            raise ValueError(
+                "Mandatory field 'cmd' is missing in the program configuration"
+            )
+        if "numprocs" not in program:
+            raise ValueError(
+                "Mandatory field 'numprocs' is missing in the program configuration"
+            )
+        if "autostart" not in program:
+            raise ValueError(
+                "Mandatory field 'autostart' is missing in the program configuration"
+            )
+        if "autorestart" not in program:
+            raise ValueError(
+                "Mandatory field 'autorestart' is missing in the program configuration"
+            )
+        if "umask" not in program:
+            raise ValueError(
+                "Mandatory field 'umask' is missing in the program configuration"
+            )
+
+        # Validate fields types
+        if not isinstance(program["cmd"], str):
+            raise ValueError("The 'cmd' field must be an string")
+        if not isinstance(program["numprocs"], int) or program["numprocs"] < 1:
+            raise ValueError("The 'numprocs' field must be an integer greater than 0")
+        if not isinstance(program["autostart"], bool):
+            raise ValueError(
+                "The 'autostart' field must be a boolean (true or false)"
+            )
+        if not isinstance(program["workingdir"], str):
+            raise ValueError(
+                "The 'workingdir' field must be a string (path to the working directory)"
+            )
+        if (
+            not isinstance(program["startretries"], int)
+            or program["startretries"] <= 0
+        ):
+            raise ValueError(
+                "The 'startretries' field must be an integer greater than 0"
+            )
+        if not isinstance(program["starttime"], int) or not (
+            1 <= program["starttime"] <= 60
+        ):
+            raise ValueError(
+                "The 'starttime' field must be an integer between 1 and 60 seconds"
+            )
+        if not isinstance(program["stoptime"], int) or not (
+            1 <= program["stoptime"] <= 60
+        ):
+            raise ValueError(
+                "The 'stoptime' field must be an integer between 1 and 60 seconds"
+            )
+        if program["exitcodes"] is not None and not isinstance(
+            program["exitcodes"], list
+        ):
+            raise ValueError("The 'exitcodes' field must be a list of integers")
 
-            # Validate fields types
-            if not isinstance(program["cmd"], str):
-                raise ValueError("The 'cmd' field must be an string")
-            if not isinstance(program["numprocs"], int) or not (
-                1 <= program["numprocs"] <= 10
+    def validate_output(self, program):
+        if not isinstance(program.get("capture", False), bool):
+            raise ValueError("The 'capture' field must be a boolean (true or false)")
+        capture_maxbytes = program.get("capture_maxbytes", 1)
+        if not isinstance(capture_maxbytes, int) or capture_maxbytes <= 0:
+            raise ValueError(
+                "The 'capture_maxbytes' field must be an integer greater than 0"
+            )
+        for key in (
+            "stdout_maxbytes",
+            "stdout_backups",
+            "stderr_maxbytes",
+            "stderr_backups",
+        ):
+            value = program.get(key, 0)
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                raise ValueError(f"The '{key}' field must be a positive integer or 0")
+
+    def validate_backoff(self, program):
+        crash_limit = program.get("crash_limit", 0)
+        if (
+            not isinstance(crash_limit, int)
+            or isinstance(crash_limit, bool)
+            or crash_limit < 0
+        ):
+            raise ValueError("The 'crash_limit' field must be a positive integer or 0")
+        for key in ("backoff", "backoff_max", "crash_window"):
+            value = program.get(key, 1)
+            if (
+                not isinstance(value, (int, float))
+                or isinstance(value, bool)
+                or value <= 0
             ):
-                raise ValueError(
-                    "The 'numprocs' field must be an integer between 1 and 10"
-                )
-            if not isinstance(program["autostart"], bool):
-                raise ValueError(
-                    "The 'autostart' field must be a boolean (true or false)"
-                )
-            if not isinstance(program["workingdir"], str):
-                raise ValueError(
-                    "The 'workingdir' field must be a string (path to the working directory)"
-                )
+                raise ValueError(f"The '{key}' field must be a number greater than 0")
+
+    def validate_zygote(self, program_name, program):
+        if not isinstance(program.get("zygote", False), bool):
+            raise ValueError("The 'zygote' field must be a boolean (true or false)")
+        preload = program.get("preload", [])
+        if not isinstance(preload, list) or not all(
+            isinstance(module, str) for module in preload
+        ):
+            raise ValueError("The 'preload' field must be a list of module names")
+        if not program.get("zygote", False):
+            return
+        # The template forks the instances, their output cannot go through a pipe
+        if program.get("capture", False) or any(
+            program.get(key, 0) for key in ("stdout_maxbytes", "stderr_maxbytes")
+        ):
+            raise ValueError(
+                f"Program '{program_name}' in zygote mode cannot use 'capture' or '*_maxbytes'"
+            )
+        argv = shlex.split(program["cmd"])
+        if (
+            len(argv) < 2
+            or not os.path.basename(argv[0]).startswith("python")
+            or (argv[1] == "-m" and len(argv) < 3)
+            or (argv[1].startswith("-") and argv[1] != "-m")
+        ):
+            raise ValueError(
+                f"Program '{program_name}' in zygote mode must run 'python -m module' or 'python script.py'"
+            )
+
+    def validate_probe(self, program_name, key, probe):
+        if not isinstance(probe, dict):
+            raise ValueError(f"The '{key}' field must be a dictionary")
+        kinds = [kind for kind in PROBE_KINDS if kind in probe]
+        if len(kinds) != 1:
+            raise ValueError(
+                f"The '{key}' probe of program '{program_name}' must have exactly one of {list(PROBE_KINDS)}"
+            )
+        kind = kinds[0]
+        target = probe[kind]
+        try:
+            if kind == "tcp":
+                if isinstance(target, bool) or not isinstance(target, (int, str)):
+                    raise ValueError
+                if not 0 < parse_tcp_target(target)[1] < 65536:
+                    raise ValueError
+            elif kind == "http":
+                parts = urllib.parse.urlsplit(target)
+                if parts.scheme != "http" or not parts.hostname or parts.port == 0:
+                    raise ValueError
+            elif not isinstance(target, str) or not target.strip():
+                raise ValueError
+        except (ValueError, TypeError, AttributeError):
+            raise ValueError(
+                f"Invalid {kind} target '{target}' in the '{key}' probe of program '{program_name}'"
+            )
+        fields = ["interval", "timeout"]
+        if key == "readiness":
+            fields.append("deadline")
+        for field in fields:
+            value = probe.get(field, 1)
             if (
-                not isinstance(program["startretries"], int)
-                or program["startretries"] <= 0
+                not isinstance(value, (int, float))
+                or isinstance(value, bool)
+                or value <= 0
             ):
                 raise ValueError(
-                    "The 'startretries' field must be an integer greater than 0"
+                    f"The '{key}.{field}' field must be a number greater than 0"
                 )
-            if not isinstance(program["starttime"], int) or not (
-                1 <= program["starttime"] <= 60
+        if key == "liveness":
+            failures = probe.get("failures", 1)
+            if (
+                not isinstance(failures, int)
+                or isinstance(failures, bool)
+                or failures < 1
             ):
                 raise ValueError(
-                    "The 'starttime' field must be an integer between 1 and 60 seconds"
+                    "The 'liveness.failures' field must be an integer greater than 0"
                 )
-            if not isinstance(program["stoptime"], int) or not (
-                1 <= program["stoptime"] <= 60
+            initial_delay = probe.get("initial_delay", 0)
+            if (
+                not isinstance(initial_delay, (int, float))
+                or isinstance(initial_delay, bool)
+                or initial_delay < 0
             ):
                 raise ValueError(
-                    "The 'stoptime' field must be an integer between 1 and 60 seconds"
+                    "The 'liveness.initial_delay' field must be a positive number or 0"
                 )
-            if program["exitcodes"] is not None and not isinstance(
-                program["exitcodes"], list
-            ):
-                raise ValueError("The 'exitcodes' field must be a list of integers")
 
-            # Validate workingdir
-            workingdir = program["workingdir"]
-            if not os.path.isdir(workingdir):
-                raise ValueError(
-                    f"Invalid working directory '{workingdir}' for program '{program_name}'"
-                )
+    def validate_program(self, program_name, program):
+        if not isinstance(program, dict):
+            raise ValueError("The 'program' key must have a dictionary value")
 
-            # Validate stopsignal
-            stopsignal = program["stopsignal"]
-            if not hasattr(signal, stopsignal) and not (1 <= int(stopsignal) <= 31):
-                raise ValueError(
-                    f"Invalid stop signal '{stopsignal}' for program '{program_name}'"
-                )
+        self.validate_fields(program)
+        self.validate_output(program)
+        self.validate_backoff(program)
+        self.validate_zygote(program_name, program)
+        for key in ("readiness", "liveness"):
+            if program.get(key) is not None:
+                self.validate_probe(program_name, key, program[key])
 
-            # Validate env
-            env = program["env"]
-            if not all(
-                isinstance(key, str) and isinstance(value, str)
-                for key, value in env.items()
-            ):
-                raise ValueError(
-                    f"Invalid environment variables for program '{program_name}', keys and values must be strings"
-                )
+        # Validate workingdir
+        workingdir = program["workingdir"]
+        if not os.path.isdir(workingdir):
+            raise ValueError(
+                f"Invalid working directory '{workingdir}' for program '{program_name}'"
+            )
 
-            # Validate auto restart values
-            autorestart_values = ["never", "always", "unexpected"]
-            if program["autorestart"] not in autorestart_values:
-                raise ValueError(
-                    f"Invalid value for 'autorestart', allowed values are: {autorestart_values}"
-                )
+        # Validate stopsignal
+        stopsignal = program["stopsignal"]
+        if not hasattr(signal, stopsignal) and not (1 <= int(stopsignal) <= 31):
+            raise ValueError(
+                f"Invalid stop signal '{stopsignal}' for program '{program_name}'"
+            )
+
+        # Validate env
+        env = program["env"]
+        if not all(
+            isinstance(key, str) and isinstance(value, str)
+            for key, value in env.items()
+        ):
+            raise ValueError(
+                f"Invalid environment variables for program '{program_name}', keys and values must be strings"
+            )
 
-            # Validate umask
-            umask_value = program["umask"]
-            if isinstance(umask_value, str) and umask_value.startswith("0o"):
-                umask_int = int(umask_value, 8)
-            else:
-                umask_int = int(umask_value)
-            if not self.is_valid_umask(umask_int):
+        # Validate auto restart values
+        autorestart_values = ["never", "always", "unexpected"]
+        if program["autorestart"] not in autorestart_values:
+            raise ValueError(
+                f"Invalid value for 'autorestart', allowed values are: {autorestart_values}"
+            )
+
+        # Validate umask
+        umask_value = program["umask"]
+        if isinstance(umask_value, str) and umask_value.startswith("0o"):
+            umask_int = int(umask_value, 8)
+        else:
+            umask_int = int(umask_value)
+        if not self.is_valid_umask(umask_int):
+            raise ValueError(
+                f"Invalid umask value '{umask_value}' for program '{program_name}'"
+            )
+        program["umask"] = umask_int
+
+        # Validate exitcodes
+        exitcodes = program["exitcodes"]
+        if exitcodes is not None:
+            if not all(self.is_valid_exitcode(exitcode) for exitcode in exitcodes):
                 raise ValueError(
-                    f"Invalid umask value '{umask_value}' for program '{program_name}'"
+                    f"Invalid exit codes '{exitcodes}' for program '{program_name}', exit codes must be integers between 0 and 255"
                 )
-            program["umask"] = umask_int
-
-            # Validate exitcodes
-            exitcodes = program["exitcodes"]
-            if exitcodes is not None:
-                if not all(self.is_valid_exitcode(exitcode) for exitcode in exitcodes):
-                    raise ValueError(
-                        f"Invalid exit codes '{exitcodes}' for program '{program_name}', exit codes must be integers between 0 and 255"
-                    )
-            else:
-                program["exitcodes"] = []
-
-            # Check if stdout and stderr are to discard
-            if (
-                "stdout" not in program
-                or program["stdout"] == "null"
-                or program["stdout"] == "none"
-            ):
-                program["stdout"] = "/dev/null"
-            if (
-                "stderr" not in program
-                or program["stderr"] == "null"
-                or program["stderr"] == "none"
-            ):
-                program["stderr"] = "/dev/null"
+        else:
+            program["exitcodes"] = []
+
+        # Check if stdout and stderr are to discard
+        if (
+            "stdout" not in program
+            or program["stdout"] == "null"
+            or program["stdout"] == "none"
+        ):
+            program["stdout"] = "/dev/null"
+        if (
+            "stderr" not in program
+            or program["stderr"] == "null"
+            or program["stderr"] == "none"
+        ):
+            program["stderr"] = "/dev/null"
 
-            # Set default values
-            program.setdefault("stopsignal", "SIGTERM")
-            program.setdefault("startretries", 3)
-            program.setdefault("starttime", 3)
-            program.setdefault("workingdir", None)
-            program.setdefault("exitcodes", [0, 2, 143])
-            program.setdefault("env", {})
+        # Set default values
+        program.setdefault("stopsignal", "SIGTERM")
+        program.setdefault("startretries", 3)
+        program.setdefault("starttime", 3)
+        program.setdefault("workingdir", None)
+        program.setdefault("exitcodes", [0, 2, 143])
+        program.setdefault("env", {})
 
     def load(self):
-        with open(self.config_path, "r") as config_file:
-            self.data = yaml.safe_load(config_file)
+        with open(self.config_path, "rb") as config_file:
+            stat = os.fstat(config_file.fileno())
+            stat_key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            cached = self._cache.get(self.config_path)
+            if cached is not None and cached[0] == stat_key:
+                self.data = cached[3]
+                return
+            content = config_file.read()
+        digest = hashlib.sha1(content).hexdigest()
+        if cached is not None and cached[1] == digest:
+            self._cache[self.config_path] = (stat_key,) + cached[1:]
+            self.data = cached[3]
+            return
+
+        # The parsed document holds no reference cycles, collecting while tens of
+        # thousands of objects are created only slows the parse down
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            raw = yaml.load(content, Loader=self.loader)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if cached is not None and self._is_programs_dict(raw):
+            self.data = self._validate_changed_programs(raw, cached[2], cached[3])
+        else:
+            self.data = self._copy_programs(raw)
             self.validate_config()
+        self._cache[self.config_path] = (stat_key, digest, raw, self.data)
+
+    def _is_programs_dict(self, data):
+        return isinstance(data, dict) and isinstance(data.get("programs"), dict)
+
+    def _copy_programs(self, raw):
+        # Validation fills in defaults, the raw sections are kept intact to be
+        # compared with the next version of the file
+        if not self._is_programs_dict(raw):
+            return raw
+        data = dict(raw)
+        data["programs"] = {
+            program_name: dict(program) if isinstance(program, dict) else program
+            for program_name, program in raw["programs"].items()
+        }
+        return data
+
+    def _validate_changed_programs(self, raw, old_raw, old_data):
+        """Validate only the program sections that differ from the cached version"""
+        old_sections = old_raw["programs"] if self._is_programs_dict(old_raw) else {}
+        old_programs = old_data["programs"] if self._is_programs_dict(old_data) else {}
+        data = dict(raw)
+        data["programs"] = {}
+        for program_name, section in raw["programs"].items():
+            if program_name in old_programs and old_sections.get(program_name) == section:
+                data["programs"][program_name] = old_programs[program_name]
+                continue
+            program = dict(section) if isinstance(section, dict) else section
+            self.validate_program(program_name, program)
+            data["programs"][program_name] = program
+        return data
 
     # Ajouter cette méthode pour rendre l'objet Config subscriptable
     def __getitem__(self, key):
@@ -1,35 +1,35 @@
 import cmd
 import signal
 import logging
+import threading
 from server.logger import Logger
-import readline
 import atexit
-import sys
-import io
 
 class ControlShell(cmd.Cmd):
     intro = "\nTaskmaster Control Shell. Type help or ? to list commands.\n"
     prompt = "(taskmaster) "
 
     def __init__(self, process_manager, logger: Logger, server=None):
-        super(ControlShell, self).__init__()
+        # In server mode output is captured per command thread through the console
+        super(ControlShell, self).__init__(
+            stdout=logger.console if server is not None else None
+        )
         self.logger = logger
         self.server = server
         self.process_manager = process_manager
+        # Whether the command run by this thread failed, for the server replies
+        self._result = threading.local()
         self.setup_signal_handlers()
-        self.setup_history()
+        # Commands from clients never go through readline
+        if server is None:
+            self.setup_history()
 
     def onecmd(self, line):
         if self.server is not None:
-            # Redirect stdout to a StringIO object
-            old_stdout = sys.stdout
-            sys.stdout = io.StringIO()
-
-            super().onecmd(line)
-
-            # Get the output from StringIO and restore stdout
-            output = sys.stdout.getvalue()
-            sys.stdout = old_stdout
+            # Capture what this command prints, other threads are not affected
+            with self.logger.console.capture() as buffer:
+                super().onecmd(line)
+            output = buffer.getvalue()
             if line.strip().lower().startswith("help"):
                 command = line.split(" ")[1] if len(line.split(" ")) > 1 else None
                 output = self.get_help_text(topic=command)
@@ -40,6 +40,29 @@ class ControlShell(cmd.Cmd):
         else:
             return super().onecmd(line)
 
+    def run_command(self, line):
+        """Run one command from a client, returns (succeeded, output)"""
+        self._result.failed = False
+        output = self.onecmd(line)
+        return not self._result.failed, output
+
+    def fail(self, message=None):
+        """Mark the running command as failed, printing message if the cause
+        was not reported already"""
+        if message is not None:
+            print(message, file=self.stdout)
+        self._result.failed = True
+
+    def check_results(self, results, process_name=None):
+        # None when the program is unknown, else {name: succeeded}
+        if results is None:
+            self.fail(f"Process '{process_name}' not found in configuration")
+        elif not all(results.values()):
+            self.fail()
+
+    def default(self, line):
+        self.fail(f"Unknown command: {line.split()[0]}")
+
     def get_help_text(self, topic=None):
         if topic is None:
             help_text = "Documented commands (type help <topic>):\n"
@@ -59,6 +82,8 @@ class ControlShell(cmd.Cmd):
                     return getattr(self, method_name).__doc__
 
     def setup_history(self):
+        import readline
+
         history_file = ".taskmaster_history"
         try:
             readline.read_history_file(history_file)
@@ -67,6 +92,8 @@ class ControlShell(cmd.Cmd):
         atexit.register(self.save_history, history_file)
 
     def save_history(self, history_file):
+        import readline
+
         readline.write_history_file(history_file)
 
     def display_cli_prompt(self):
@@ -75,24 +102,26 @@ class ControlShell(cmd.Cmd):
 
     def do_history(self, arg):
         "Display the command history"
+        import readline
+
         num_commands = readline.get_current_history_length()
         if num_commands == 0:
-            print("No command history available.")
+            print("No command history available.", file=self.stdout)
         else:
-            print("Command history:")
+            print("Command history:", file=self.stdout)
             for i in range(num_commands):
-                print(f"{i + 1}: {readline.get_history_item(i + 1)}")
+                print(f"{i + 1}: {readline.get_history_item(i + 1)}", file=self.stdout)
 
     def do_attach(self, arg):
         "Attach to a process (not available in server): ATTACH <process_name> <instance_number>"
         if self.server is not None:
-            self.logger.error(
+            self.fail(
                 "Cannot attach to a process when TaskMaster is running in server mode."
             )
             return
         args = arg.split()
         if len(args) == 0:
-            self.logger.error("No process name provided.")
+            self.fail("No process name provided.")
             return
 
         process_name = args[0]
@@ -101,50 +130,91 @@ class ControlShell(cmd.Cmd):
             try:
                 instance_number = int(args[1])
             except ValueError:
-                self.logger.error("Invalid instance number provided.")
+                self.fail("Invalid instance number provided.")
                 return
 
         self.process_manager.attach_instance(process_name, instance_number)
 
+    def do_tail(self, arg):
+        "Show the last output of a process: TAIL [-f] <process_name> [instance_number] [stdout|stderr]"
+        args = arg.split()
+        if args[:1] == ["-f"]:
+            # Over the control server the stream is handled by TaskMasterServer
+            return self.do_attach(" ".join(args[1:]))
+        if len(args) == 0:
+            self.fail("No process name provided.")
+            return
+        stream_type = "stdout"
+        if args[-1] in ("stdout", "stderr"):
+            stream_type = args.pop()
+        instance_number = None
+        if len(args) > 1:
+            try:
+                instance_number = int(args[1])
+            except ValueError:
+                self.fail("Invalid instance number provided.")
+                return
+        outputs = self.process_manager.read_output(
+            args[0], instance_number, stream_type
+        )
+        if not outputs:
+            # Unknown process or instance, already logged
+            self.fail()
+        for name, output in outputs:
+            self.stdout.write(f"==> {name} {stream_type} <==\n")
+            self.stdout.write(output.decode(errors="replace"))
+            if output and not output.endswith(b"\n"):
+                self.stdout.write("\n")
+
     def do_config(self, arg):
         "Display the config of all processes"
         if not arg:
             arg = " ".join(self.process_manager.processes.keys())
         for process in arg.split():
-            self.process_manager.display_process_config(process)
+            if not self.process_manager.display_process_config(process, self.stdout):
+                self.fail(f"Process '{process}' not found in configuration")
 
     def do_status(self, arg):
         "Display the status of all processes"
-        self.process_manager.status()
+        self.process_manager.status(self.stdout)
 
     def do_start(self, arg):
         "Start a process: START <process name>"
-        self.process_manager.start_process(arg)
+        self.check_results(self.process_manager.start_process(arg), arg)
 
     def do_startall(self, arg):
         "Start all processes"
-        self.process_manager.start_all()
+        self.check_results(self.process_manager.start_all())
 
     def do_stop(self, arg):
         "Stop a process: STOP <process name>"
         self.logger.error("Stopping process..")
-        self.process_manager.stop_process(arg)
+        self.check_results(self.process_manager.stop_process(arg), arg)
 
     def do_stopall(self, arg):
         "Stop all processes"
-        self.process_manager.stop_all()
+        self.check_results(self.process_manager.stop_all())
 
     def do_restart(self, arg):
         "Restart a process: RESTART <process name>"
-        self.process_manager.restart_process(arg)
+        self.check_results(self.process_manager.restart_process(arg), arg)
+
+    def do_restartall(self, arg):
+        "Restart all processes"
+        self.check_results(self.process_manager.restart_all())
 
     def do_reload(self, arg):
         "Reload the configuration file"
-        self.process_manager.reload_configuration(arg)
+        if not self.process_manager.reload_configuration(arg):
+            self.fail()
 
     def do_quit(self, arg):
-        "Exit the Taskmaster Control Shell"
-        self.process_manager.stop_all()
+        "Exit the Taskmaster Control Shell: QUIT [--keep] (--keep leaves the processes running)"
+        if arg.strip() == "--keep":
+            self.logger.info("Leaving all processes running.")
+            self.process_manager.detach()
+        else:
+            self.process_manager.stop_all()
         self.logger.info("Exiting Taskmaster Control Shell")
         if self.server is not None:
             self.server.stop()
@@ -176,14 +246,17 @@ class ControlShell(cmd.Cmd):
                 self.process_manager.stop_all()
                 self.logger.info("All processes stopped. Exiting.")
                 exit(0)
+            elif signum == signal.SIGQUIT:
+                self.logger.warning("Leaving all processes running.")
+                self.process_manager.detach()
+                self.logger.info("Processes detached. Exiting.")
+                exit(0)
             elif signum == signal.SIGHUP:
-                self.logger.warning(
-                    f"Reloading configuration and restarting processes."
-                )
+                self.logger.warning("Reloading configuration.")
                 self.process_manager.reload_configuration()
             elif signum == signal.SIGUSR1:
                 self.logger.warning(f"Displaying current process status.")
-                self.process_manager.status()
+                self.process_manager.status(self.stdout)
             elif signum == signal.SIGUSR2:
                 self.toggle_logging_level()
             self.display_cli_prompt()
@@ -0,0 +1,125 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+
+class EventLoop:
+    """Run an asyncio loop in a background thread to drive process supervision"""
+
+    def __init__(self, logger, poll_interval=None):
+        self.logger = logger
+        self.poll_interval = poll_interval
+        self.use_pidfd = poll_interval is None and hasattr(os, "pidfd_open")
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self._polled = {}
+        self._polling = False
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name="taskmaster-event-loop", daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if not self.in_loop_thread():
+            self.thread.join(timeout=5)
+
+    def in_loop_thread(self):
+        return threading.current_thread() is self.thread
+
+    def call_soon(self, callback, *args):
+        if self.in_loop_thread():
+            return self.loop.call_soon(callback, *args)
+        return self.loop.call_soon_threadsafe(callback, *args)
+
+    def call_later(self, delay, callback, *args):
+        """Schedule callback on the loop, the handle is only returned in the loop thread"""
+        if self.in_loop_thread():
+            return self.loop.call_later(delay, callback, *args)
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, callback, *args)
+        return None
+
+    def run_sync(self, callback, *args):
+        """Run callback on the loop thread and return its result"""
+        if self.in_loop_thread() or not self.loop.is_running():
+            return callback(*args)
+        future = concurrent.futures.Future()
+
+        def run():
+            try:
+                future.set_result(callback(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.loop.call_soon_threadsafe(run)
+        return future.result()
+
+    def run_coroutine(self, coro):
+        """Schedule coro on the loop and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def watch_child(self, process, callback):
+        """Call callback(process, return_code) from the loop once process exits"""
+        if self.in_loop_thread():
+            self._watch_child(process, callback)
+        else:
+            self.call_soon(self._watch_child, process, callback)
+
+    def _watch_child(self, process, callback):
+        if self.use_pidfd:
+            try:
+                pidfd = os.pidfd_open(process.pid)
+            except ProcessLookupError:
+                # Already reaped by a concurrent poll()
+                self._child_exited(process, callback)
+                return
+            except OSError as e:
+                self.logger.warning(
+                    f"pidfd_open failed for pid {process.pid}: {e}, falling back to polling"
+                )
+            else:
+                self.loop.add_reader(
+                    pidfd, self._on_pidfd_ready, pidfd, process, callback
+                )
+                return
+        self._polled[process] = callback
+        if not self._polling:
+            self._polling = True
+            self.loop.call_soon(self._poll_children)
+
+    def _on_pidfd_ready(self, pidfd, process, callback):
+        self.loop.remove_reader(pidfd)
+        os.close(pidfd)
+        self._child_exited(process, callback)
+
+    def _poll_children(self):
+        for process, callback in list(self._polled.items()):
+            if process.poll() is not None:
+                del self._polled[process]
+                self._child_exited(process, callback)
+        if self._polled:
+            self.loop.call_later(self.poll_interval or 1, self._poll_children)
+        else:
+            self._polling = False
+
+    def _child_exited(self, process, callback):
+        # The child is a zombie (or already reaped) at this point, wait() returns at once
+        return_code = process.wait()
+        try:
+            callback(process, return_code)
+        except Exception as e:
+            self.logger.error("Error while handling exit of pid %s: %s", process.pid, e)
+
+
+if __name__ == "__main__":
+    print("This module is not meant to be run directly.")
+    print("Please run main.py instead.")
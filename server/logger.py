@@ -1,14 +1,73 @@
+import atexit
+import contextlib
+import io
 import logging
-from logging.handlers import RotatingFileHandler, SMTPHandler, SysLogHandler
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    SysLogHandler,
+)
 import os
+import queue
+import sys
+import threading
+
+
+class Console(threading.local):
+    """Stdout replacement that a thread can capture without touching sys.stdout"""
+
+    buffer = None
+
+    def write(self, text):
+        return (self.buffer or sys.stdout).write(text)
+
+    def flush(self):
+        (self.buffer or sys.stdout).flush()
+
+    @contextlib.contextmanager
+    def capture(self):
+        previous, self.buffer = self.buffer, io.StringIO()
+        try:
+            yield self.buffer
+        finally:
+            self.buffer = previous
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Hand records to the listener thread, count those a full queue drops"""
+
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """Stop after the records already queued, even when the queue is full"""
+
+    def enqueue_sentinel(self):
+        # put_nowait would raise on a full queue, the thread frees room soon
+        self.queue.put(self._sentinel)
 
 
 class Logger:
     display_cli_prompt_method = None
+    console = Console()
 
     _instances = {}
     _max_size = 1024 * 1024 * 10  # 10MB
     _backup_count = 5
+    _queue_size = 10000
 
     # ANSI color codes
     COLORS = {
@@ -27,62 +86,114 @@ class Logger:
             instance = super().__new__(cls)
             instance.logger = logging.getLogger(name)
             instance.logger.setLevel(log_level)
-
-            formatter = logging.Formatter(
-                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-            )
-
-            if log_file:
-                os.makedirs(os.path.dirname(log_file), exist_ok=True)
-                file_handler = RotatingFileHandler(
-                    log_file, maxBytes=cls._max_size, backupCount=cls._backup_count
-                )
-                file_handler.setFormatter(formatter)
-                instance.logger.addHandler(file_handler)
-
-            if smtp_config:
-                smtp_handler = SMTPHandler(
-                    mailhost=smtp_config["mailhost"],
-                    fromaddr=smtp_config["fromaddr"],
-                    toaddrs=smtp_config["toaddrs"],
-                    subject=smtp_config["subject"],
-                    credentials=smtp_config["credentials"],
-                    secure=smtp_config["secure"],
-                )
-                smtp_handler.setLevel(logging.ERROR)
-                smtp_handler.setFormatter(formatter)
-                instance.logger.addHandler(smtp_handler)
-
-            if syslog_config:
-                syslog_handler = SysLogHandler(
-                    address=syslog_config["address"],
-                    facility=syslog_config["facility"],
-                )
-                syslog_handler.setFormatter(formatter)
-                instance.logger.addHandler(syslog_handler)
+            # Cleared in daemon mode, where stdout is a file nobody reads
+            instance.console_enabled = True
+            instance.handler_config = (log_file, smtp_config, syslog_config)
+            instance.queue_handler = BoundedQueueHandler(queue.Queue(cls._queue_size))
+            instance.listener = None
+            instance.start_listener()
+            atexit.register(instance.stop_listener)
 
             cls._instances[name] = instance
         return cls._instances[name]
 
-    def log(self, message, level=logging.INFO, display_cli_prompt=False):
-        self.display_on_cli(message, level, display_cli_prompt)
-        self.logger.log(level, message)
+    def _create_handlers(self):
+        log_file, smtp_config, syslog_config = self.handler_config
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        )
+        handlers = []
+
+        if log_file:
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            file_handler = RotatingFileHandler(
+                log_file, maxBytes=self._max_size, backupCount=self._backup_count
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        if smtp_config:
+            # smtplib and email are only worth importing when mails are sent
+            from server.mail import DigestSMTPHandler
+
+            smtp_handler = DigestSMTPHandler(
+                mailhost=smtp_config["mailhost"],
+                fromaddr=smtp_config["fromaddr"],
+                toaddrs=smtp_config["toaddrs"],
+                subject=smtp_config["subject"],
+                credentials=smtp_config["credentials"],
+                secure=smtp_config["secure"],
+                interval=smtp_config.get("digest_interval", 60),
+                max_records=smtp_config.get("digest_max_records", 100),
+            )
+            smtp_handler.setLevel(logging.ERROR)
+            smtp_handler.setFormatter(formatter)
+            handlers.append(smtp_handler)
+
+        if syslog_config:
+            syslog_handler = SysLogHandler(
+                address=syslog_config["address"],
+                facility=syslog_config["facility"],
+            )
+            syslog_handler.setFormatter(formatter)
+            handlers.append(syslog_handler)
+        return handlers
+
+    def start_listener(self):
+        """Open the file, mail and syslog handlers and write to them from a thread"""
+        # The caller only pays for an enqueue
+        if self.listener is not None:
+            return
+        handlers = self._create_handlers()
+        if not handlers:
+            return
+        self.listener = DrainingQueueListener(
+            self.queue_handler.queue, *handlers, respect_handler_level=True
+        )
+        self.logger.addHandler(self.queue_handler)
+        self.listener.start()
+
+    def stop_listener(self):
+        """Flush the queue and close the file, mail and syslog handlers"""
+        if self.listener is None:
+            return
+        self.listener.stop()
+        self.logger.removeHandler(self.queue_handler)
+        for handler in self.listener.handlers:
+            handler.close()
+        self.listener = None
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_handler.queue.qsize(),
+            "dropped": self.queue_handler.dropped,
+        }
+
+    def _log(self, level, message, args, display_cli_prompt):
+        # Nothing is formatted for disabled levels, and console rendering is
+        # skipped unless someone reads it (foreground shell or a captured command)
+        if not self.logger.isEnabledFor(level):
+            return
+        if self.console_enabled or self.console.buffer is not None:
+            self.display_on_cli(
+                message % args if args else message, level, display_cli_prompt
+            )
+        self.logger.log(level, message, *args)
+
+    def log(self, message, *args, level=logging.INFO, display_cli_prompt=False):
+        self._log(level, message, args, display_cli_prompt)
 
-    def debug(self, message, display_cli_prompt=False):
-        self.display_on_cli(message, logging.DEBUG, display_cli_prompt)
-        self.logger.debug(message)
+    def debug(self, message, *args, display_cli_prompt=False):
+        self._log(logging.DEBUG, message, args, display_cli_prompt)
 
-    def info(self, message, display_cli_prompt=False):
-        self.display_on_cli(message, logging.INFO, display_cli_prompt)
-        self.logger.info(message)
+    def info(self, message, *args, display_cli_prompt=False):
+        self._log(logging.INFO, message, args, display_cli_prompt)
 
-    def warning(self, message, display_cli_prompt=False):
-        self.display_on_cli(message, logging.WARNING, display_cli_prompt)
-        self.logger.warning(message)
+    def warning(self, message, *args, display_cli_prompt=False):
+        self._log(logging.WARNING, message, args, display_cli_prompt)
 
-    def error(self, message, display_cli_prompt=False):
-        self.display_on_cli(message, logging.ERROR, display_cli_prompt)
-        self.logger.error(message)
+    def error(self, message, *args, display_cli_prompt=False):
+        self._log(logging.ERROR, message, args, display_cli_prompt)
 
     def redisplay_cli_prompt(self):
         if self.display_cli_prompt_method is not None:
@@ -90,13 +201,12 @@ class Logger:
 
     def display_on_cli(self, message, level, display_cli_prompt=False):
         color = self.COLORS.get(logging.getLevelName(level), "")
-        print(color + message + self.COLORS["RESET"])
+        print(color + message + self.COLORS["RESET"], file=self.console)
         if display_cli_prompt:
             self.redisplay_cli_prompt()
 
-    def critical(self, message, display_cli_prompt=False):
-        self.display_on_cli(message, logging.CRITICAL, display_cli_prompt)
-        self.logger.critical(message)
+    def critical(self, message, *args, display_cli_prompt=False):
+        self._log(logging.CRITICAL, message, args, display_cli_prompt)
 
 
 if __name__ == "__main__":
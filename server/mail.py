@@ -0,0 +1,84 @@
+import email.utils
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from logging.handlers import SMTPHandler
+
+
+class DigestSMTPHandler(SMTPHandler):
+    """Send records as one digest mail at most every interval seconds"""
+
+    def __init__(self, *args, interval=60, max_records=100, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval = interval
+        self.max_records = max_records
+        self.records = []
+        self.dropped = 0
+        self.last_sent = None
+        self.timer = None
+        self.digest_lock = threading.Lock()
+
+    def emit(self, record):
+        with self.digest_lock:
+            if len(self.records) < self.max_records:
+                self.records.append(record)
+            else:
+                self.dropped += 1
+            if self.last_sent is not None:
+                delay = self.last_sent + self.interval - time.monotonic()
+                if delay > 0:
+                    if self.timer is None:
+                        self.timer = threading.Timer(delay, self.flush)
+                        self.timer.daemon = True
+                        self.timer.start()
+                    return
+        self.flush()
+
+    def flush(self):
+        with self.digest_lock:
+            records, self.records = self.records, []
+            dropped, self.dropped = self.dropped, 0
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not records:
+                return
+            self.last_sent = time.monotonic()
+        try:
+            self.send_digest(records, dropped)
+        except Exception:
+            self.handleError(records[-1])
+
+    def send_digest(self, records, dropped):
+        body = "\n".join(self.format(record) for record in records)
+        if dropped:
+            body += f"\n\n{dropped} more records were dropped from this digest."
+        msg = EmailMessage()
+        msg["From"] = self.fromaddr
+        msg["To"] = ",".join(self.toaddrs)
+        msg["Subject"] = f"{self.subject} ({len(records) + dropped} records)"
+        msg["Date"] = email.utils.localtime()
+        msg.set_content(body)
+        smtp = smtplib.SMTP(
+            self.mailhost, self.mailport or smtplib.SMTP_PORT, timeout=self.timeout
+        )
+        try:
+            if self.username:
+                if self.secure is not None:
+                    smtp.ehlo()
+                    smtp.starttls(*self.secure)
+                    smtp.ehlo()
+                smtp.login(self.username, self.password)
+            smtp.send_message(msg)
+        finally:
+            smtp.quit()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+if __name__ == "__main__":
+    print("This module is not meant to be run directly.")
+    print("Please run main.py instead.")
@@ -1,15 +1,26 @@
 import json
-import daemon
 import sys
 import os
 
-from daemon import pidfile
-
+# Each mode imports what it needs (daemon, the control shell, the server) once
+# it is chosen, health checks start faster that way
 from server.process_manager import ProcessManager
-from server.control_shell import ControlShell
 from server.logger import Logger
-from server.utils import parse_args, drop_privileges
-from server.server import TaskMasterServer
+from server.metrics import MetricsServer
+from server.utils import (
+    parse_args,
+    drop_privileges,
+    raise_open_files_limit,
+    resolve_socket_peers,
+)
+
+
+def load_json_config(path):
+    """Parsed JSON file at path, None when no path was given"""
+    if not path:
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
 
 
 def main():
@@ -19,16 +30,19 @@ def main():
 
         # Convert the configuration file path to an absolute path
         args.config = os.path.abspath(args.config)
+        # The daemon changes its working directory to /
+        if args.state_file:
+            args.state_file = os.path.abspath(args.state_file)
+        if args.server_socket:
+            args.server_socket = os.path.abspath(args.server_socket)
+        if args.no_tcp and not args.server_socket:
+            raise ValueError("--no-tcp needs --server-socket")
+        socket_uids, socket_gids = resolve_socket_peers(
+            args.socket_users, args.socket_groups
+        )
 
-        smtp_config = None
-        if args.smtp_config:
-            with open(args.smtp_config, "r") as f:
-                smtp_config = json.load(f)
-
-        syslog_config = None
-        if args.syslog_config:
-            with open(args.syslog_config, "r") as f:
-                syslog_config = json.load(f)
+        smtp_config = load_json_config(args.smtp_config)
+        syslog_config = load_json_config(args.syslog_config)
 
         # Create the log file directory if it doesn't exist
         if os.path.dirname(args.logfile) and not os.path.exists(
@@ -46,17 +60,22 @@ def main():
         logger.info("Starting TaskMaster")
         if args.user and args.group:
             drop_privileges(args.user, args.group, logger)
+        raise_open_files_limit(logger)
 
         if args.server:
+            import daemon
+            from daemon import pidfile
+
+            from server.server import TaskMasterServer
+
             logger.info("Starting TaskMaster as a server")
             with open(args.logfile, "a") as log_file:
                 logger.info(
                     f"Redirecting stdout and stderr to log file 'taskmaster.log' in {args.logfile}"
                 )
-                # Close all handlers before entering server context
-                for handler in logger.logger.handlers:
-                    handler.close()
-                    logger.logger.removeHandler(handler)
+                # Close all handlers before entering server context, the
+                # listener thread would not survive the fork
+                logger.stop_listener()
 
                 context = daemon.DaemonContext(
                     pidfile=pidfile.TimeoutPIDLockFile(args.pidfile),
@@ -65,20 +84,48 @@ def main():
                 )
 
                 with context:
-                    # Re-initialize the logger with the new log file
+                    # Records go to the log file through the handlers, rendering
+                    # them on stdout as well would write every line twice
+                    logger.console_enabled = False
+                    logger.start_listener()
                     logger.info("Starting server")
-                    process_manager = ProcessManager(args.config, logger)
+                    process_manager = ProcessManager(
+                        args.config,
+                        logger,
+                        parallelism=args.parallelism,
+                        sample_interval=args.sample_interval,
+                        state_file=args.state_file,
+                    )
+                    if args.metrics_port:
+                        MetricsServer(
+                            process_manager, logger, args.metrics_addr, args.metrics_port
+                        ).start()
                     server = TaskMasterServer(
                         process_manager=process_manager,
                         logger=logger,
                         host=args.server_addr,
-                        port=args.server_port,
+                        port=None if args.no_tcp else args.server_port,
+                        socket_path=args.server_socket,
+                        allowed_uids=socket_uids,
+                        allowed_gids=socket_gids,
                     )
                     server.start()
 
         else:
+            from server.control_shell import ControlShell
+
             logger.info("Starting TaskMaster in the foreground")
-            process_manager = ProcessManager(args.config, logger)
+            process_manager = ProcessManager(
+                args.config,
+                logger,
+                parallelism=args.parallelism,
+                sample_interval=args.sample_interval,
+                state_file=args.state_file,
+            )
+            if args.metrics_port:
+                MetricsServer(
+                    process_manager, logger, args.metrics_addr, args.metrics_port
+                ).start()
             control_shell = ControlShell(process_manager, logger)
             logger.display_cli_prompt_method = control_shell.display_cli_prompt
             control_shell.cmdloop()
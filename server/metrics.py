@@ -0,0 +1,252 @@
+import bisect
+import threading
+
+# Upper bounds in seconds, +Inf is implied
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_PROBE_INTERVAL = 0.5
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for key, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values.
+
+    Updates are a dict lookup and an add, each metric is only updated from
+    one thread (the event loop or the control server loop).
+    """
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        # list() copies in one step, the loop thread may add a series meanwhile
+        for label_values, value in sorted(list(self.values.items())):
+            labels = format_labels(zip(self.label_names, label_values))
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per tuple of label values"""
+
+    def __init__(self, name, help_text, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, value, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            # One count per bucket plus +Inf, then sum
+            series = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for label_values, series in sorted(list(self.values.items())):
+            labels = list(zip(self.label_names, label_values))
+            series = list(series)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                bucket_labels = format_labels(labels + [("le", bound)])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """Supervisor internals in the Prometheus text format"""
+
+    def __init__(self):
+        self.spawn_duration = Histogram(
+            "taskmaster_spawn_duration_seconds",
+            "Time spent creating the child process.",
+            ("program",),
+        )
+        self.start_duration = Histogram(
+            "taskmaster_start_duration_seconds",
+            "Time from the first spawn attempt to the running state.",
+            ("program",),
+        )
+        self.command_duration = Histogram(
+            "taskmaster_command_duration_seconds",
+            "Time to answer a control command.",
+            ("command",),
+        )
+        self.loop_lag = Histogram(
+            "taskmaster_event_loop_lag_seconds",
+            "Delay of a timer on the supervision event loop.",
+        )
+        self.start_failures = Counter(
+            "taskmaster_start_failures_total",
+            "Start attempts that failed.",
+            ("program",),
+        )
+        self.crashes = Counter(
+            "taskmaster_crashes_total",
+            "Running processes that exited with an unexpected code.",
+            ("program",),
+        )
+        self.restarts = Counter(
+            "taskmaster_restarts_total",
+            "Restarts scheduled after a process exited.",
+            ("program",),
+        )
+        self.liveness_kills = Counter(
+            "taskmaster_liveness_kills_total",
+            "Running processes killed after failing their liveness probe.",
+            ("program",),
+        )
+        self.last_loop_lag = 0.0
+
+    def watch_loop(self, event_loop, interval=LAG_PROBE_INTERVAL):
+        """Measure how late a timer fires on the event loop, every interval seconds"""
+
+        def probe(expected):
+            lag = max(0.0, event_loop.loop.time() - expected)
+            self.last_loop_lag = lag
+            self.loop_lag.observe(lag)
+            event_loop.loop.call_later(interval, probe, event_loop.loop.time() + interval)
+
+        event_loop.call_soon(
+            lambda: event_loop.loop.call_later(
+                interval, probe, event_loop.loop.time() + interval
+            )
+        )
+
+    def render(self, process_manager=None, logger=None):
+        lines = []
+        for metric in (
+            self.spawn_duration,
+            self.start_duration,
+            self.start_failures,
+            self.crashes,
+            self.restarts,
+            self.liveness_kills,
+            self.command_duration,
+            self.loop_lag,
+        ):
+            lines.extend(metric.render())
+        lines.extend(
+            [
+                "# HELP taskmaster_event_loop_last_lag_seconds Lag of the last timer probe.",
+                "# TYPE taskmaster_event_loop_last_lag_seconds gauge",
+                f"taskmaster_event_loop_last_lag_seconds {self.last_loop_lag}",
+            ]
+        )
+        if process_manager is not None:
+            lines.extend(self._render_instances(process_manager))
+        if logger is not None:
+            stats = logger.stats()
+            lines.extend(
+                [
+                    "# HELP taskmaster_log_queue_depth Log records waiting to be written.",
+                    "# TYPE taskmaster_log_queue_depth gauge",
+                    f"taskmaster_log_queue_depth {stats['queue_depth']}",
+                    "# HELP taskmaster_log_records_dropped_total Log records dropped on a full queue.",
+                    "# TYPE taskmaster_log_records_dropped_total counter",
+                    f"taskmaster_log_records_dropped_total {stats['dropped']}",
+                ]
+            )
+        return "\n".join(lines) + "\n"
+
+    def _render_instances(self, process_manager):
+        # Read at scrape time, keeping the state machine free of metric updates
+        lines = [
+            "# HELP taskmaster_instance_state Current state of each instance.",
+            "# TYPE taskmaster_instance_state gauge",
+        ]
+        for program_name, process_list in list(process_manager.processes.items()):
+            for process_controller in list(process_list):
+                labels = format_labels(
+                    [
+                        ("program", program_name),
+                        ("instance", process_controller.name),
+                        ("state", process_controller.state),
+                    ]
+                )
+                lines.append(f"taskmaster_instance_state{labels} 1")
+        return lines
+
+
+# Shared by the controllers, the manager and the control server
+metrics = Metrics()
+
+
+class MetricsServer:
+    """Serve GET /metrics over plain HTTP from a background thread"""
+
+    def __init__(self, process_manager, logger, host="localhost", port=9100):
+        self.process_manager = process_manager
+        self.logger = logger
+        self.host = host
+        self.port = port
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        # Only imported when metrics are served, the controllers use this module
+        import http.server
+
+        process_manager, logger = self.process_manager, self.logger
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render(process_manager, logger).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name="taskmaster-metrics", daemon=True
+        )
+        self.thread.start()
+        metrics.watch_loop(process_manager.event_loop)
+        self.logger.info("Metrics served on http://%s:%s/metrics", self.host, self.port)
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+
+if __name__ == "__main__":
+    print("This module is not meant to be run directly.")
+    print("Please run main.py instead.")
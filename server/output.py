@@ -0,0 +1,280 @@
+import codecs
+import collections
+import os
+
+READ_SIZE = 64 * 1024
+DEFAULT_CAPTURE_MAXBYTES = 64 * 1024
+
+
+class RingBuffer:
+    """Keep the last maxbytes bytes written to it"""
+
+    __slots__ = ("maxbytes", "chunks", "size", "total")
+
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.chunks = collections.deque()
+        self.size = 0
+        # Number of bytes ever written, readers use it as a stream offset
+        self.total = 0
+
+    def write(self, data):
+        if len(data) >= self.maxbytes:
+            self.chunks.clear()
+            data = data[-self.maxbytes:] if self.maxbytes else b""
+            self.size = 0
+        self.chunks.append(data)
+        self.size += len(data)
+        self.total += len(data)
+        while self.size > self.maxbytes:
+            overflow = self.size - self.maxbytes
+            first = self.chunks[0]
+            if len(first) <= overflow:
+                self.chunks.popleft()
+                self.size -= len(first)
+            else:
+                self.chunks[0] = first[overflow:]
+                self.size -= overflow
+
+    def getvalue(self):
+        return b"".join(self.chunks)
+
+
+class RotatingFile:
+    """An output file written by the daemon, rotated once it reaches
+    rotate_maxbytes (0 never rotates).
+
+    Every instance of a program writes to the same path, they share one
+    RotatingFile so the size is counted once and the file is rotated once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.file_size = 0
+        self.rotate_maxbytes = 0
+        self.backups = 0
+        # Captures writing to it, the file is closed with the last one
+        self.users = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._open_file()
+
+    def configure(self, rotate_maxbytes=0, backups=0):
+        # Rotating the null device makes no sense
+        self.rotate_maxbytes = rotate_maxbytes if self.path != os.devnull else 0
+        self.backups = backups
+
+    def _open_file(self):
+        self.file = open(self.path, "ab", buffering=0)
+        self.file_size = os.fstat(self.file.fileno()).st_size
+
+    def rotate(self):
+        """Move the file to path.1 (path.1 to path.2, ...) and start a new one.
+
+        Runs on the loop between two reads, the children keep writing to
+        their pipes and never see the file change.
+        """
+        self.file.close()
+        try:
+            if self.backups > 0:
+                for idx in range(self.backups - 1, 0, -1):
+                    source = f"{self.path}.{idx}"
+                    if os.path.exists(source):
+                        os.replace(source, f"{self.path}.{idx + 1}")
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                # No backups wanted, start the same file over
+                os.truncate(self.path, 0)
+        finally:
+            self._open_file()
+
+    def write(self, data):
+        if self.file is None:
+            return
+        try:
+            while data:
+                if self.rotate_maxbytes:
+                    if self.file_size >= self.rotate_maxbytes:
+                        self.rotate()
+                    # Split the chunk so no file grows past rotate_maxbytes
+                    room = self.rotate_maxbytes - self.file_size
+                    chunk, data = data[:room], data[room:]
+                else:
+                    chunk, data = data, b""
+                self.file.write(chunk)
+                self.file_size += len(chunk)
+        except OSError:
+            # A full disk or a removed directory must not stop the readers,
+            # the pipes would fill up and block the children
+            if self.file.closed:
+                self.file = None
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class OutputFiles:
+    """The RotatingFiles of a manager by path, opened by the first capture
+    writing to a path and closed with the last one. Used from the loop."""
+
+    def __init__(self):
+        self.files = {}
+
+    def acquire(self, path, rotate_maxbytes=0, backups=0):
+        key = os.path.abspath(path)
+        rotating_file = self.files.get(key)
+        if rotating_file is None:
+            rotating_file = self.files[key] = RotatingFile(path)
+        rotating_file.users += 1
+        rotating_file.configure(rotate_maxbytes, backups)
+        return rotating_file
+
+    def release(self, rotating_file):
+        rotating_file.users -= 1
+        if rotating_file.users == 0:
+            self.files.pop(os.path.abspath(rotating_file.path), None)
+            rotating_file.close()
+
+
+class OutputCapture:
+    """Read one output stream of a child through a pipe on the event loop.
+
+    Everything read is written through to the configured file and kept in a
+    ring buffer, so tail and attach never need an extra process or disk reads.
+    The file comes from output_files, shared with the other captures of the
+    same path.
+    """
+
+    def __init__(
+        self, event_loop, output_files, path, maxbytes, rotate_maxbytes=0, backups=0
+    ):
+        self.event_loop = event_loop
+        self.output_files = output_files
+        self.path = None
+        self.file = None
+        self.buffer = RingBuffer(maxbytes)
+        self.listeners = []
+        # Read ends not at end of file yet, the file is kept until they are
+        self.read_fds = set()
+        self.closed = False
+        self.configure(path, maxbytes, rotate_maxbytes, backups)
+
+    def configure(self, path, maxbytes, rotate_maxbytes=0, backups=0):
+        self.buffer.maxbytes = maxbytes
+        if path != self.path:
+            self._close_file()
+            self.file = self.output_files.acquire(path, rotate_maxbytes, backups)
+            self.path = path
+        else:
+            self.file.configure(rotate_maxbytes, backups)
+
+    def open_pipe(self):
+        """Return the write end to hand to the child, reading starts right away"""
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        self.read_fds.add(read_fd)
+        self.event_loop.call_soon(self._add_reader, read_fd)
+        return write_fd
+
+    def _add_reader(self, read_fd):
+        self.event_loop.loop.add_reader(read_fd, self._on_readable, read_fd)
+
+    def _on_readable(self, read_fd):
+        try:
+            data = os.read(read_fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.event_loop.loop.remove_reader(read_fd)
+            os.close(read_fd)
+            self.read_fds.discard(read_fd)
+            if self.closed and not self.read_fds:
+                self._close_file()
+            return
+        if self.file is not None:
+            self.file.write(data)
+        self.buffer.write(data)
+        for listener in list(self.listeners):
+            listener(data)
+
+    def read(self):
+        """Buffered output, safe to call from any thread"""
+        return self.event_loop.run_sync(self.buffer.getvalue)
+
+    def subscribe(self, listener):
+        """Call listener(data) from the loop for every new chunk"""
+        self.event_loop.run_sync(self.listeners.append, listener)
+
+    def unsubscribe(self, listener):
+        self.event_loop.run_sync(self.listeners.remove, listener)
+
+    def close(self):
+        """Release the file once the output still in the pipes is written,
+        from the loop. The capture is not used again."""
+        self.closed = True
+        self.listeners.clear()
+        if not self.read_fds:
+            self._close_file()
+
+    def _close_file(self):
+        if self.file is not None:
+            self.output_files.release(self.file)
+            self.file = None
+
+
+class FileFollower:
+    """Read a growing output file incrementally by byte offset, like tail -f"""
+
+    def __init__(self, path, initial_bytes=4096):
+        self.path = path
+        self.fd = None
+        self.offset = 0
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        if self._open():
+            self.offset = max(0, os.fstat(self.fd).st_size - initial_bytes)
+
+    def _open(self):
+        try:
+            self.fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            self.fd = None
+        self.offset = 0
+        return self.fd is not None
+
+    def read(self, size=READ_SIZE):
+        """Return the text appended since the last call, at most size bytes"""
+        if self.fd is None and not self._open():
+            return ""
+        if os.fstat(self.fd).st_size < self.offset:
+            # Truncated, start over
+            self.offset = 0
+        data = os.pread(self.fd, size, self.offset)
+        if not data and self._replaced():
+            # Rotated, the old file is fully read, follow the new one
+            os.close(self.fd)
+            if not self._open():
+                return ""
+            data = os.pread(self.fd, size, self.offset)
+        self.offset += len(data)
+        return self.decoder.decode(data)
+
+    def _replaced(self):
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.fd).st_ino
+        except OSError:
+            return False
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+if __name__ == "__main__":
+    print("This module is not meant to be run directly.")
+    print("Please run main.py instead.")
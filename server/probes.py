@@ -0,0 +1,110 @@
+import asyncio
+import os
+import shlex
+import subprocess
+import urllib.parse
+
+PROBE_KINDS = ("tcp", "http", "command", "file")
+
+# Defaults of the readiness and liveness settings, each can be set per probe
+DEFAULT_INTERVAL = 1
+DEFAULT_TIMEOUT = 1
+DEFAULT_READY_DEADLINE = 60
+DEFAULT_FAILURES = 3
+DEFAULT_INITIAL_DELAY = 0
+
+
+def probe_kind(probe):
+    for kind in PROBE_KINDS:
+        if kind in probe:
+            return kind
+    return None
+
+
+def parse_tcp_target(target):
+    """(host, port) of a tcp probe: a port number or "host:port" """
+    if isinstance(target, int):
+        return "127.0.0.1", target
+    host, _, port = target.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class Prober:
+    """Run the readiness and liveness probes of an instance on the event loop.
+
+    A probe is one check done within its timeout, it never raises: any error
+    counts as a failure.
+    """
+
+    def __init__(self, event_loop, env=None, workingdir=None):
+        self.event_loop = event_loop
+        self.env = env
+        self.workingdir = workingdir
+
+    async def check(self, probe):
+        kind = probe_kind(probe)
+        timeout = probe.get("timeout", DEFAULT_TIMEOUT)
+        try:
+            return await asyncio.wait_for(
+                getattr(self, f"_check_{kind}")(probe[kind]), timeout
+            )
+        except (asyncio.TimeoutError, OSError, ValueError):
+            return False
+
+    async def _check_tcp(self, target):
+        host, port = parse_tcp_target(target)
+        _, writer = await asyncio.open_connection(host, port)
+        writer.close()
+        return True
+
+    async def _check_http(self, url):
+        # A bare HTTP/1.0 request, the daemon does not import http.client
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, parts.port or 80
+        )
+        try:
+            writer.write(
+                f"GET {path} HTTP/1.0\r\nHost: {parts.netloc}\r\n\r\n".encode()
+            )
+            status_line = await reader.readline()
+        finally:
+            writer.close()
+        status = status_line.split()
+        return len(status) >= 2 and 200 <= int(status[1]) < 400
+
+    async def _check_command(self, command):
+        process = subprocess.Popen(
+            shlex.split(command),
+            cwd=self.workingdir,
+            env=self.env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        exited = self.event_loop.loop.create_future()
+
+        def on_exit(process, return_code):
+            if not exited.done():
+                exited.set_result(return_code)
+
+        self.event_loop.watch_child(process, on_exit)
+        try:
+            return await exited == 0
+        finally:
+            # Timed out or the instance went away, the exit is still reaped
+            if process.returncode is None:
+                process.kill()
+
+    async def _check_file(self, path):
+        if self.workingdir:
+            path = os.path.join(self.workingdir, path)
+        return os.path.exists(path)
+
+
+if __name__ == "__main__":
+    print("This module is not meant to be run directly.")
+    print("Please run main.py instead.")
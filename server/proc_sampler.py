@@ -0,0 +1,184 @@
+import collections
+import os
+import time
+
+HISTORY_SIZE = 60
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# Offsets in /proc/<pid>/stat counted after the "(comm)" field
+STAT_STATE = 0
+STAT_UTIME = 11
+STAT_STIME = 12
+STAT_THREADS = 17
+STAT_STARTTIME = 19
+STAT_RSS = 21
+
+
+def read_proc_stat(stat_fd):
+    """Return (cpu_ticks, threads, rss_bytes) from an open /proc/<pid>/stat"""
+    # pread on a kept fd regenerates the file, saving an open and a close
+    data = os.pread(stat_fd, 4096, 0)
+    # comm may contain spaces and parentheses, the fields start after the last ')'
+    fields = data[data.rfind(b")") + 2:].split()
+    return (
+        int(fields[STAT_UTIME]) + int(fields[STAT_STIME]),
+        int(fields[STAT_THREADS]),
+        int(fields[STAT_RSS]) * PAGE_SIZE,
+    )
+
+
+def read_start_time(pid):
+    """Start time of a live pid in clock ticks since boot, None if it is gone.
+
+    With the pid it identifies a process across pid reuse.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as stat_file:
+            data = stat_file.read()
+    except OSError:
+        return None
+    fields = data[data.rfind(b")") + 2:].split()
+    if fields[STAT_STATE] in (b"Z", b"X"):
+        return None
+    return int(fields[STAT_STARTTIME])
+
+
+def count_fds(pid):
+    path = f"/proc/{pid}/fd"
+    try:
+        # Since Linux 6.2 the size of the directory is the number of fds,
+        # which saves listing it
+        count = os.stat(path).st_size
+        return count if count > 0 else len(os.listdir(path))
+    except OSError:
+        return None
+
+
+class ProcessHistory:
+    """Last samples of one process, a new pid starts a new history"""
+
+    __slots__ = ("pid", "stat_fd", "ticks", "sampled_at", "samples")
+
+    def __init__(self, pid, history_size):
+        self.pid = pid
+        # The fd stays bound to this process, a reused pid fails with ESRCH
+        self.stat_fd = os.open(f"/proc/{pid}/stat", os.O_RDONLY)
+        self.ticks = None
+        self.sampled_at = None
+        self.samples = collections.deque(maxlen=history_size)
+
+    def close(self):
+        if self.stat_fd is not None:
+            os.close(self.stat_fd)
+            self.stat_fd = None
+
+
+class ProcessSampler:
+    """Sample CPU, memory, threads and open fds of every managed process.
+
+    All processes are read in one pass on the event loop every interval
+    seconds. /proc/<pid>/stat carries the cpu time, threads and rss (statm
+    would only repeat the rss), and the fd directory gives the fd count.
+    """
+
+    def __init__(
+        self, event_loop, get_controllers, interval=5, history_size=HISTORY_SIZE
+    ):
+        self.event_loop = event_loop
+        self.get_controllers = get_controllers
+        self.interval = interval
+        self.history_size = history_size
+        self.histories = {}
+        self.last_pass_duration = None
+        self._timer = None
+
+    def start(self):
+        if self.interval > 0:
+            self.event_loop.call_soon(self._run)
+
+    def stop(self):
+        self.event_loop.call_soon(self._cancel)
+
+    def _cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for history in self.histories.values():
+            history.close()
+        self.histories = {}
+
+    def _run(self):
+        self.sample(self.get_controllers())
+        self._timer = self.event_loop.loop.call_later(self.interval, self._run)
+
+    def sample(self, controllers):
+        """Take one sample of every running process in controllers"""
+        start = time.monotonic()
+        now = time.time()
+        histories = {}
+        for process_controller in controllers:
+            process = process_controller.process
+            if process is None or process.returncode is not None:
+                continue
+            history = self.histories.pop(process_controller, None)
+            try:
+                if history is None or history.pid != process.pid:
+                    if history is not None:
+                        history.close()
+                    history = ProcessHistory(process.pid, self.history_size)
+                ticks, threads, rss = read_proc_stat(history.stat_fd)
+            except OSError:
+                # Exited since the check, the exit callback is on its way
+                if history is not None:
+                    history.close()
+                continue
+            cpu_percent = None
+            if history.ticks is not None and start > history.sampled_at:
+                cpu_percent = round(
+                    (ticks - history.ticks)
+                    / CLOCK_TICKS
+                    / (start - history.sampled_at)
+                    * 100,
+                    1,
+                )
+            history.ticks = ticks
+            history.sampled_at = start
+            history.samples.append(
+                {
+                    "time": now,
+                    "cpu_percent": cpu_percent,
+                    "rss": rss,
+                    "threads": threads,
+                    "fds": count_fds(process.pid),
+                }
+            )
+            histories[process_controller] = history
+        # Processes that exited or were removed leave with their history
+        for history in self.histories.values():
+            history.close()
+        self.histories = histories
+        self.last_pass_duration = time.monotonic() - start
+
+    def latest(self):
+        """Last sample of every sampled process keyed by controller, from any thread"""
+        return self.event_loop.run_sync(self._latest)
+
+    def _latest(self):
+        return {
+            process_controller: history.samples[-1]
+            for process_controller, history in self.histories.items()
+        }
+
+    def history(self, process_controller):
+        """Every kept sample of one process, oldest first"""
+        return self.event_loop.run_sync(self._history, process_controller)
+
+    def _history(self, process_controller):
+        history = self.histories.get(process_controller)
+        return list(history.samples) if history is not None else []
+
+
+if __name__ == "__main__":
+    print("This module is not meant to be run directly.")
+    print("Please run main.py instead.")
@@ -1,27 +1,121 @@
+import asyncio
+import concurrent.futures
+import collections
+import functools
 import os
+import random
 import subprocess
 import signal
-import time
 import shlex
+import sys
+import time
+
+from server.metrics import metrics
+from server.output import DEFAULT_CAPTURE_MAXBYTES, OutputCapture, OutputFiles
+from server.probes import (
+    DEFAULT_FAILURES,
+    DEFAULT_INITIAL_DELAY,
+    DEFAULT_INTERVAL,
+    DEFAULT_READY_DEADLINE,
+    Prober,
+)
+from server.state import process_age
+
+
+STOPPED = "stopped"
+STARTING = "starting"
+RUNNING = "running"
+BACKOFF = "backoff"
+STOPPING = "stopping"
+EXITED = "exited"
+FATAL = "fatal"
+
+# Restart backoff and crash loop defaults, each can be set per program
+DEFAULT_BACKOFF = 1
+DEFAULT_BACKOFF_MAX = 60
+DEFAULT_CRASH_LIMIT = 5
+DEFAULT_CRASH_WINDOW = 60
+
+
+def build_env(program_config):
+    """Environment of a program's processes, built once and shared by its instances"""
+    env = os.environ.copy()
+    env.update(program_config.get("env", {}))
+    return env
 
 
 class ProcessController:
-    def __init__(self, name, config, logger):
+    # One controller exists per instance, programs can run thousands of them.
+    # The config dict is shared by all instances of a program, output files are
+    # only held open during the spawn and waiter lists are created on demand.
+    __slots__ = (
+        "name",
+        "program",
+        "config",
+        "logger",
+        "event_loop",
+        "on_exit",
+        "env",
+        "zygote",
+        "process",
+        "monitor",
+        "state",
+        "attempt",
+        "started_at",
+        "first_spawn_at",
+        "captures",
+        "output_files",
+        "crash_times",
+        "fatal_reason",
+        "liveness_killed",
+        "_killed",
+        "_start_timer",
+        "_start_waiters",
+        "_liveness",
+        "_stop_timer",
+        "_stop_waiters",
+    )
+
+    def __init__(
+        self,
+        name,
+        config,
+        logger,
+        event_loop,
+        on_exit=None,
+        program=None,
+        env=None,
+        zygote=None,
+        output_files=None,
+    ):
         self.name = name
+        self.program = program or name
         self.config = config
         self.logger = logger
-        self.umask = None
+        self.event_loop = event_loop
+        self.on_exit = on_exit
+        # Replaced together with config on a reload
+        self.env = env if env is not None else build_env(config)
+        self.zygote = zygote
         self.process = None
-        self.stdout = None
-        self.stderr = None
         self.monitor = False
-
-    def _initproc(self):
-        try:
-            os.umask(self.umask)
-            os.close(0)  # Close stdin, for program like cat for example
-        except Exception as e:
-            self.logger.warning(f"Failed to set umask for process '{self.name}': {e}")
+        self.state = STOPPED
+        self.attempt = 0
+        self.started_at = None
+        self.first_spawn_at = None
+        self.captures = None
+        # Shared by the instances of a manager, they write to the same files
+        self.output_files = output_files if output_files is not None else OutputFiles()
+        self.crash_times = None
+        self.fatal_reason = None
+        # Killed by its liveness probe, restarted whatever autorestart says
+        self.liveness_killed = False
+        self._killed = False
+        self._start_timer = None
+        self._start_waiters = None
+        self._liveness = None
+        self._stop_timer = None
+        self._stop_waiters = None
 
     def is_active(self):
         return self.process and self.process.poll() is None
@@ -31,6 +125,9 @@ class ProcessController:
             self.logger.warning(f"Process '{self.name}' is not running")
             return
         try:
+            if self.captures is not None and "stdout" in self.captures:
+                self._attach_capture()
+                return
             stdout_path = self.config["stdout"]
             command = f"tail -f {stdout_path}"
             tail_process = subprocess.Popen(shlex.split(command))
@@ -42,91 +139,445 @@ class ProcessController:
         except Exception as e:
             self.logger.error(f"Failed to attach to process '{self.name}': {e}")
 
+    def _attach_capture(self):
+        # Follow the captured output straight from the daemon, no tail process
+        capture = self.captures["stdout"]
+
+        def display(data):
+            sys.stdout.write(data.decode(errors="replace"))
+            sys.stdout.flush()
+
+        display(capture.read())
+        capture.subscribe(display)
+        try:
+            input("Press Enter to detach from the process...\n")
+        finally:
+            capture.unsubscribe(display)
+
+    def read_output(self, stream_type="stdout", maxbytes=DEFAULT_CAPTURE_MAXBYTES):
+        """Last output of the process, from memory when it is captured"""
+        if self.captures is not None and stream_type in self.captures:
+            return self.captures[stream_type].read()[-maxbytes:]
+        output_path = self.config.get(stream_type)
+        if not output_path or not os.path.isfile(output_path):
+            return b""
+        with open(output_path, "rb") as output_file:
+            size = output_file.seek(0, os.SEEK_END)
+            output_file.seek(max(0, size - maxbytes))
+            return output_file.read()
+
     def start(self):
-        retries = self.config.get("startretries", 3)
-        for attempt in range(retries):
-            try:
-                if self.is_active():
-                    self.logger.warning(f"Process '{self.name}' is already running")
-                    return
-
-                env = os.environ.copy()
-                env.update(self.config.get("env", {}))
-
-                self.stdout = self._get_output_stream("stdout")
-                self.stderr = self._get_output_stream("stderr")
-                self.umask = self.config.get("umask", "022")
-
-                cmd_list = shlex.split(self.config["cmd"])
-
-                self.process = subprocess.Popen(
-                    cmd_list,
-                    shell=False,
-                    cwd=self.config.get("workingdir", None),
-                    env=env,
-                    preexec_fn=self._initproc,
-                    stdout=self.stdout,
-                    stderr=self.stderr,
+        """Start the process without blocking.
+
+        Returns a concurrent.futures.Future resolved with True once the process
+        survived its start window, or False once every attempt failed.
+        """
+        future = concurrent.futures.Future()
+        self.event_loop.call_soon(self._start, future)
+        return future
+
+    def _start(self, future):
+        if self.state in (STARTING, BACKOFF):
+            self._start_waiters.append(future)
+            return
+        if self.is_active():
+            self.logger.warning(f"Process '{self.name}' is already running")
+            future.set_result(True)
+            return
+        self._start_waiters = [future]
+        self.attempt = 0
+        # An operator start gives a crash looping program a fresh window
+        self.crash_times = None
+        self._spawn()
+
+    def adopt(self, process):
+        """Supervise a process left running by a previous taskmaster"""
+        self.event_loop.call_soon(self._adopt, process)
+
+    def _adopt(self, process):
+        self.started_at = time.monotonic() - process_age(process.start_ticks)
+        self.process = process
+        self.state = RUNNING
+        self.monitor = True
+        self.liveness_killed = False
+        self.attempt = 0
+        self.event_loop.watch_child(process, self._on_process_exit)
+        self.watch_liveness()
+
+    def _spawn(self, wait_for_zygote=True):
+        self._start_timer = None
+        if wait_for_zygote and self.zygote is not None and not self.zygote.ready:
+            # The template is preloading, the wait is cancelled like a start
+            # timer and a template that failed to start fails the attempt
+            self.state = STARTING
+            self._start_timer = self.zygote.when_ready(
+                lambda: self._spawn(wait_for_zygote=False)
+            )
+            return
+        self.attempt += 1
+        stdout = stderr = None
+        try:
+            spawn_start = time.monotonic()
+            if self.attempt == 1:
+                self.first_spawn_at = spawn_start
+            if self.zygote is not None:
+                # Answered from the loop, the fork is cancelled like a timer
+                self.state = STARTING
+                self._start_timer = self.zygote.fork(
+                    functools.partial(self._on_forked, spawn_start=spawn_start),
+                    self._on_process_exit,
+                    self._output_path("stdout"),
+                    self._output_path("stderr"),
+                    self.config.get("umask", 0o022),
                 )
-                time.sleep(self.config.get("starttime", 5))  # TODO: Find better impl
-                if (
-                    self.process.poll() in self.config.get("exitcodes", [0])
-                    or self.is_active()
-                ):
-                    self.logger.info(f"Process '{self.name}' started successfully")
-                    self.monitor = True
-                    break
-                else:
-                    self.logger.warning(
-                        f"Failed to start process '{self.name}', attempt {attempt + 1}/{retries}"
-                    )
-            except Exception as e:
+                return
+            stdout = self._get_output_stream("stdout")
+            stderr = self._get_output_stream("stderr")
+
+            cmd_list = shlex.split(self.config["cmd"])
+
+            # No Python code runs in the child, so CPython can use vfork
+            # instead of copying the page tables of the whole daemon
+            process = subprocess.Popen(
+                cmd_list,
+                shell=False,
+                cwd=self.config.get("workingdir", None),
+                env=self.env,
+                umask=self.config.get("umask", 0o022),
+                stdin=subprocess.DEVNULL,
+                stdout=stdout,
+                stderr=stderr,
+            )
+        except Exception as e:
+            self._spawn_failed(e)
+            return
+        finally:
+            # The child has its own copies of the output descriptors
+            self._close_output_streams(stdout, stderr)
+        self._spawned(process, spawn_start)
+
+    def _spawn_failed(self, error):
+        self.logger.warning(
+            "Failed to start process '%s', attempt %s/%s: %s",
+            self.name,
+            self.attempt,
+            self.config.get("startretries", 3),
+            error,
+        )
+        self._retry_start()
+
+    def _on_forked(self, process, error, spawn_start):
+        self._start_timer = None
+        if error is not None:
+            self._spawn_failed(error)
+        else:
+            self._spawned(process, spawn_start)
+
+    def _spawned(self, process, spawn_start):
+        self.state = STARTING
+        # Set before the process, info() reads them from other threads
+        self.started_at = time.monotonic()
+        self.process = process
+        metrics.spawn_duration.observe(self.started_at - spawn_start, self.program)
+        # The zygote reports the exit of the instances it forked
+        if self.zygote is None:
+            self.event_loop.watch_child(self.process, self._on_process_exit)
+        # A readiness probe replaces the start window, the task is cancelled
+        # like the timer
+        if self.config.get("readiness"):
+            self._start_timer = self.event_loop.loop.create_task(
+                self._wait_until_ready(self.process, self.config["readiness"])
+            )
+            return
+        self._start_timer = self.event_loop.call_later(
+            self.config.get("starttime", 5), self._on_start_window_elapsed, self.process
+        )
+
+    def _prober(self):
+        return Prober(self.event_loop, self.env, self.config.get("workingdir"))
+
+    async def _wait_until_ready(self, process, readiness):
+        prober = self._prober()
+        interval = readiness.get("interval", DEFAULT_INTERVAL)
+        deadline = time.monotonic() + readiness.get("deadline", DEFAULT_READY_DEADLINE)
+        while not await prober.check(readiness):
+            if time.monotonic() + interval > deadline:
+                self._start_timer = None
                 self.logger.warning(
-                    f"Failed to start process '{self.name}', attempt {attempt + 1}/{retries}: {e}"
+                    "Process '%s' was not ready within %ss, attempt %s/%s",
+                    self.name,
+                    readiness.get("deadline", DEFAULT_READY_DEADLINE),
+                    self.attempt,
+                    self.config.get("startretries", 3),
                 )
+                # Its exit is ignored, the attempt already failed
+                process.kill()
+                self._retry_start()
+                return
+            await asyncio.sleep(interval)
+        self._start_timer = None
+        self._set_started()
+
+    def _on_start_window_elapsed(self, process):
+        self._start_timer = None
+        if process is not self.process or self.state != STARTING:
+            return
+        self._set_started()
+
+    def _set_started(self):
+        self.logger.info(
+            "Process '%s' started successfully", self.name, display_cli_prompt=True
+        )
+        self.state = RUNNING
+        self.monitor = True
+        self.liveness_killed = False
+        metrics.start_duration.observe(
+            time.monotonic() - self.first_spawn_at, self.program
+        )
+        self._resolve_start(True)
+        self.watch_liveness()
+
+    def watch_liveness(self):
+        """Probe a running instance if its program has a liveness probe, from
+        the loop. The settings are read again before every probe."""
         if (
-            self.process and
-            self.process.poll() not in self.config.get("exitcodes", [0])
-            and not self.is_active()
+            self._liveness is None
+            and self.state == RUNNING
+            and self.config.get("liveness")
         ):
+            self._liveness = self.event_loop.loop.create_task(
+                self._check_liveness(
+                    self.process,
+                    self.config["liveness"].get("initial_delay", DEFAULT_INITIAL_DELAY),
+                )
+            )
+
+    def _stop_liveness(self):
+        if self._liveness is not None:
+            self._liveness.cancel()
+            self._liveness = None
+
+    async def _check_liveness(self, process, initial_delay):
+        await asyncio.sleep(initial_delay)
+        failures = 0
+        while True:
+            liveness = self.config.get("liveness")
+            if not liveness:
+                # Removed by a reload
+                self._liveness = None
+                return
+            await asyncio.sleep(liveness.get("interval", DEFAULT_INTERVAL))
+            if await self._prober().check(liveness):
+                failures = 0
+                continue
+            failures += 1
+            if failures >= liveness.get("failures", DEFAULT_FAILURES):
+                break
+        self._liveness = None
+        self.logger.warning(
+            "Process '%s' failed %s liveness probes in a row, killing it",
+            self.name,
+            failures,
+            display_cli_prompt=True,
+        )
+        metrics.liveness_kills.inc(self.program)
+        # The exit is handled like a crash, the instance is restarted even if
+        # autorestart would leave it down
+        self.liveness_killed = True
+        process.kill()
+
+    def _retry_start(self):
+        metrics.start_failures.inc(self.program)
+        retries = self.config.get("startretries", 3)
+        if self.attempt >= retries:
+            self.state = FATAL
+            self.fatal_reason = "could not be started"
+            self.logger.error(
+                f"Failed to start process '{self.name}' after {retries} attempts",
+                display_cli_prompt=True,
+            )
+            self._resolve_start(False)
+            return
+        self.state = BACKOFF
+        self._start_timer = self.event_loop.call_later(
+            self._backoff_delay(self.attempt), self._spawn
+        )
+
+    def _backoff_delay(self, failures):
+        """Exponential delay capped at backoff_max, with jitter so that a group
+        of instances failing together does not retry in lockstep"""
+        backoff = self.config.get("backoff", DEFAULT_BACKOFF)
+        backoff_max = self.config.get("backoff_max", DEFAULT_BACKOFF_MAX)
+        delay = min(backoff_max, backoff * 2 ** (failures - 1))
+        return delay * random.uniform(0.5, 1)
+
+    def schedule_restart(self):
+        """Restart an exited process from the loop after a backoff delay.
+
+        The first exit in crash_window seconds restarts at once, each further
+        one doubles the delay. After crash_limit exits in the window the
+        process goes FATAL and stays down until an operator starts it.
+        """
+        self.event_loop.call_soon(self._schedule_restart)
+
+    def _schedule_restart(self):
+        if self.state != EXITED:
+            return
+        now = time.monotonic()
+        crash_limit = self.config.get("crash_limit", DEFAULT_CRASH_LIMIT)
+        crash_window = self.config.get("crash_window", DEFAULT_CRASH_WINDOW)
+        if self.crash_times is None:
+            self.crash_times = collections.deque()
+        self.crash_times.append(now)
+        while self.crash_times[0] < now - crash_window:
+            self.crash_times.popleft()
+        crashes = len(self.crash_times)
+        if crash_limit and crashes >= crash_limit:
+            self.monitor = False
+            self.state = FATAL
+            self.fatal_reason = f"crash loop: {crashes} exits in {crash_window}s"
             self.logger.error(
-                f"Failed to start process '{self.name}' after {retries} attempts"
+                "Process '%s' exited %s times in %s seconds, giving up",
+                self.name,
+                crashes,
+                crash_window,
+                display_cli_prompt=True,
             )
+            return
+        delay = self._backoff_delay(crashes - 1) if crashes > 1 else 0
+        metrics.restarts.inc(self.program)
+        self.logger.info("Restarting process '%s' in %.1f seconds", self.name, delay)
+        # Like a stop then start, monitoring resumes once the start succeeds
+        self.monitor = False
+        self.attempt = 0
+        self._start_waiters = []
+        self.state = BACKOFF
+        self._start_timer = self.event_loop.loop.call_later(delay, self._spawn)
+
+    def _resolve_start(self, result):
+        waiters, self._start_waiters = self._start_waiters or (), None
+        for future in waiters:
+            if not future.done():
+                future.set_result(result)
+
+    def _abort_start(self):
+        if self._start_timer is not None:
+            self._start_timer.cancel()
+            self._start_timer = None
+        if self.state in (STARTING, BACKOFF):
+            self._resolve_start(False)
+        self.state = STOPPED
+
+    def _on_process_exit(self, process, return_code):
+        # Exits of a previous incarnation or of a stopped process are not ours to handle
+        if process is not self.process:
+            return
+        self._stop_liveness()
+        if self.state == STOPPING:
+            self._stop_timer.cancel()
+            self._stop_timer = None
+            self.state = STOPPED
+            self.terminate_process()
+            self._resolve_stop(not self._killed)
+            return
+        if self.state == STARTING:
+            self._start_timer.cancel()
+            self._start_timer = None
+            if return_code not in self.config.get("exitcodes", [0]):
+                self.logger.warning(
+                    "Failed to start process '%s', attempt %s/%s",
+                    self.name,
+                    self.attempt,
+                    self.config.get("startretries", 3),
+                )
+                self._retry_start()
+                return
+            # Exiting with an expected code during the start window is a success
+            self._set_started()
+        if self.state != RUNNING or not self.monitor:
+            return
+        self.state = EXITED
+        if return_code not in self.config.get("exitcodes", [0]):
+            metrics.crashes.inc(self.program)
+        if self.on_exit is not None:
+            self.on_exit(self, return_code)
 
     def terminate_process(self):
         self.process.terminate()
-        self._close_output_streams()
-        self.logger.info(f"Process '{self.name}' terminated successfully")
+        self.logger.info("Process '%s' terminated successfully", self.name)
 
     def stop(self):
+        """Stop the process without blocking.
+
+        Returns a concurrent.futures.Future resolved with True once the process
+        exited on its stop signal, or False if it had to be killed after stoptime.
+        """
+        future = concurrent.futures.Future()
+        self.event_loop.call_soon(self._stop, future)
+        return future
+
+    def _stop(self, future):
+        self.monitor = False
+        self._stop_liveness()
+        if self.state == STOPPING:
+            self._stop_waiters.append(future)
+            return
+        self._abort_start()
+        if not self.is_active():
+            if self.process is not None:
+                self.terminate_process()
+            future.set_result(True)
+            return
         stop_signal = getattr(
             signal, self.config.get("stopsignal", "SIGTERM"), signal.SIGTERM
         )
-        self.monitor = False
-        timeout = self.config.get("stoptime", 10)
+        self._stop_waiters = [future]
+        self._killed = False
+        self.state = STOPPING
         self.process.send_signal(stop_signal)
-        for _ in range(timeout):
-            if self.process.poll() is not None:
-                break
-            time.sleep(1)
-        else:
-            # If the process didn't terminate within the timeout, send SIGKILL signal
-            self.logger.warning(
-                f"Process '{self.name}' did not stop within the timeout, sending SIGKILL"
-            )
-            try:
-                self.process.send_signal(signal.SIGKILL)
-            except Exception as e:
-                self.logger.error(f"Error while killing process '{self.name}': {e}")
-        self.terminate_process()
+        self._stop_timer = self.event_loop.call_later(
+            self.config.get("stoptime", 10), self._on_stop_timeout, self.process
+        )
 
+    def _on_stop_timeout(self, process):
+        if process is not self.process or self.state != STOPPING:
+            return
+        # If the process didn't terminate within the timeout, send SIGKILL signal
+        self.logger.warning(
+            f"Process '{self.name}' did not stop within the timeout, sending SIGKILL"
+        )
+        self._killed = True
+        try:
+            self.process.send_signal(signal.SIGKILL)
+        except Exception as e:
+            self.logger.error(f"Error while killing process '{self.name}': {e}")
+
+    def _resolve_stop(self, result):
+        waiters, self._stop_waiters = self._stop_waiters or (), None
+        for future in waiters:
+            if not future.done():
+                future.set_result(result)
 
     def restart(self):
-        self.stop()
-        self.start()
+        """Stop then start the process, returns a Future with the start result"""
+        return self.event_loop.run_coroutine(self._restart())
+
+    async def _restart(self):
+        await asyncio.wrap_future(self.stop())
+        return await asyncio.wrap_future(self.start())
 
     def status(self):
-        if self.process:
+        if self.state == STARTING:
+            return "starting"
+        elif self.state == STOPPING:
+            return "stopping"
+        elif self.state == BACKOFF:
+            if not self.attempt:
+                return "backoff (waiting to restart)"
+            return f"backoff (attempt {self.attempt}/{self.config.get('startretries', 3)})"
+        elif self.state == FATAL:
+            return f"fatal ({self.fatal_reason})"
+        elif self.process:
             return_code = self.process.poll()
             if return_code is None:
                 return "running"
@@ -137,13 +588,42 @@ class ProcessController:
         else:
             return "stopped"
 
+    def info(self):
+        """Status of the instance as plain data, safe to call from any thread"""
+        process = self.process
+        started_at = self.started_at
+        pid = return_code = uptime = None
+        if process is not None:
+            pid = process.pid
+            # returncode is set by the reaper, reading it never waits on the child
+            return_code = process.returncode
+            if return_code is None and started_at is not None:
+                uptime = time.monotonic() - started_at
+        return {
+            "name": self.name,
+            "state": self.state,
+            "pid": pid,
+            "uptime": uptime,
+            "exitcode": return_code,
+        }
+
+    def uses_pipe(self, stream_type):
+        # Rotation needs the daemon between the child and the file
+        return bool(
+            self.config.get("capture", False)
+            or (
+                self.config.get(stream_type)
+                and self.config.get(f"{stream_type}_maxbytes", 0)
+            )
+        )
+
     def _get_output_stream(self, stream_type):
         output_path = self.config.get(stream_type, None)
+        if self.uses_pipe(stream_type):
+            return self._get_capture_pipe(stream_type, output_path or os.devnull)
+        self._drop_capture(stream_type)
         if output_path:
-            if os.path.dirname(output_path) and not os.path.exists(
-                os.path.dirname(output_path)
-            ):
-                os.makedirs(os.path.dirname(output_path))
+            self._make_output_dir(output_path)
             try:
                 return open(output_path, "a")
             except Exception as e:
@@ -154,11 +634,62 @@ class ProcessController:
         else:
             return subprocess.DEVNULL
 
-    def _close_output_streams(self):
-        if self.stdout:
-            self.stdout.close()
-        if self.stderr:
-            self.stderr.close()
+    def _output_path(self, stream_type):
+        # Opened by the zygote, in the forked instance
+        self._drop_capture(stream_type)
+        output_path = self.config.get(stream_type) or os.devnull
+        self._make_output_dir(output_path)
+        return output_path
+
+    def _make_output_dir(self, output_path):
+        if os.path.dirname(output_path) and not os.path.exists(
+            os.path.dirname(output_path)
+        ):
+            os.makedirs(os.path.dirname(output_path))
+
+    def _get_capture_pipe(self, stream_type, output_path):
+        maxbytes = self.config.get("capture_maxbytes", DEFAULT_CAPTURE_MAXBYTES)
+        rotate_maxbytes = self.config.get(f"{stream_type}_maxbytes", 0)
+        backups = self.config.get(f"{stream_type}_backups", 0)
+        try:
+            if self.captures is None:
+                self.captures = {}
+            capture = self.captures.get(stream_type)
+            if capture is None:
+                capture = OutputCapture(
+                    self.event_loop,
+                    self.output_files,
+                    output_path,
+                    maxbytes,
+                    rotate_maxbytes,
+                    backups,
+                )
+                self.captures[stream_type] = capture
+            else:
+                capture.configure(output_path, maxbytes, rotate_maxbytes, backups)
+        except Exception as e:
+            self.logger.warning(f"Failed to open {stream_type} file '{output_path}': {e}")
+            return subprocess.DEVNULL
+        return capture.open_pipe()
+
+    def _drop_capture(self, stream_type):
+        # Capture or rotation turned off by a reload
+        if self.captures is not None and stream_type in self.captures:
+            self.captures.pop(stream_type).close()
+
+    def close_output(self):
+        """Release the captured output of an instance that was removed, from
+        the loop once it is stopped"""
+        captures, self.captures = self.captures, None
+        for capture in (captures or {}).values():
+            capture.close()
+
+    def _close_output_streams(self, *streams):
+        for stream in streams:
+            if hasattr(stream, "close"):
+                stream.close()
+            elif isinstance(stream, int) and stream >= 0:
+                os.close(stream)
 
 
 if __name__ == "__main__":
@@ -1,20 +1,113 @@
-import threading
-import time
+import asyncio
+import os
 
 from server.config import Config
-from server.process import ProcessController
+from server.event_loop import EventLoop
+from server.output import OutputFiles
+from server.proc_sampler import ProcessSampler, read_start_time
+from server.process import (
+    ProcessController,
+    STARTING,
+    BACKOFF,
+    STOPPED,
+    EXITED,
+    FATAL,
+    build_env,
+)
+from server.reload_plan import ReloadPlan, spawn_hash
+from server.state import StateSnapshot
+from server.zygote import Zygote
 
 import json
 
+# Seconds between two checks for a change worth writing to the state file
+STATE_SAVE_INTERVAL = 1
+
 
 class ProcessManager:
-    def __init__(self, config_path, logger):
+    """Own the programs and their instances.
+
+    Concurrency model: controllers are only changed on the event loop, which
+    is their single owner. Commands from the shell, the server threads and
+    signal handlers are submitted to the loop as coroutines. Each program has
+    an asyncio lock taken by every operation on it, so operations on one
+    program run in order while different programs proceed in parallel.
+    self.processes and its lists are never changed in place, a reload swaps
+    in new ones, so any thread can read a snapshot without a lock.
+    """
+
+    def __init__(
+        self,
+        config_path,
+        logger,
+        poll_interval=None,
+        parallelism=64,
+        sample_interval=5,
+        state_file=None,
+    ):
         self.config_path = config_path
         self.logger = logger
+        self.parallelism = parallelism
         self.processes = {}
+        # Template processes of the programs in zygote mode, used on the loop
+        self.zygotes = {}
+        # Output files written by the daemon, shared by the instances of a program
+        self.output_files = OutputFiles()
         self._monitoring = False
-        self._load_configuration()
+        # Created and awaited on the loop only
+        self._locks = {}
+        self._reload_lock = None
+        self.state = StateSnapshot(state_file, logger) if state_file else None
+        self._saved_signature = None
+        self.event_loop = EventLoop(logger, poll_interval=poll_interval)
+        self.sampler = ProcessSampler(
+            self.event_loop, self._all_controllers, interval=sample_interval
+        )
+        # The loop drives process starts, so it has to run before autostart
         self._start_monitoring()
+        self._load_configuration()
+        if self.state is not None:
+            self.event_loop.call_soon(self._save_state_periodically)
+
+    def _create_controller(
+        self, process_name, program_config, program_name, env, zygote=None
+    ):
+        return ProcessController(
+            name=process_name,
+            config=program_config,
+            logger=self.logger,
+            event_loop=self.event_loop,
+            on_exit=self._on_process_exit,
+            program=program_name,
+            env=env,
+            zygote=zygote,
+            output_files=self.output_files,
+        )
+
+    def _create_zygote(self, program_name, program_config, env):
+        """Template of a program in zygote mode, started on its first spawn"""
+        if not program_config.get("zygote", False):
+            return None
+        zygote = Zygote(program_name, program_config, env, self.logger, self.event_loop)
+        self.zygotes[program_name] = zygote
+        return zygote
+
+    def _instance_name(self, program_name, idx, numprocs):
+        return f"{program_name}_{idx}" if numprocs > 1 else program_name
+
+    def _create_instances(
+        self, program_name, program_config, first, last, env, zygote=None
+    ):
+        return [
+            self._create_controller(
+                self._instance_name(program_name, idx, program_config["numprocs"]),
+                program_config,
+                program_name,
+                env,
+                zygote,
+            )
+            for idx in range(first, last)
+        ]
 
     def _load_configuration(self):
         try:
@@ -26,111 +119,285 @@ class ProcessManager:
         if not config["programs"]:
             self.logger.error("No program found in configuration file")
             return
+        saved = self.state.load() if self.state is not None else {}
         for program_name, program_config in config["programs"].items():
             self.logger.info(f"Loading configuration for program '{program_name}'")
             if program_name not in self.processes:
                 self.processes[program_name] = []
 
             numprocs = program_config.get("numprocs", 1)
-            if numprocs < 1 or numprocs > 10:
+            if numprocs < 1:
                 self.logger.error(
                     f"Invalid number of processes for program '{program_name}'"
                 )
                 continue
+            env = build_env(program_config)
+            zygote = self._create_zygote(program_name, program_config, env)
             for i in range(numprocs):
-                process_name = f"{program_name}_{i}" if numprocs > 1 else program_name
-                process_controller = ProcessController(
-                    name=process_name, config=program_config, logger=self.logger
+                process_name = self._instance_name(program_name, i, numprocs)
+                process_controller = self._create_controller(
+                    process_name, program_config, program_name, env, zygote
+                )
+                saved_instance = saved.pop((program_name, i), None)
+                adopted = saved_instance is not None and self._adopt(
+                    process_controller, *saved_instance
                 )
-                if process_controller.config.get("autostart", False):
+                if not adopted and process_controller.config.get("autostart", False):
                     process_controller.start()
                 self.processes[program_name].append(process_controller)
+        for (program_name, idx), (_, pid, start_ticks) in saved.items():
+            process = self.state.adopt(pid, start_ticks)
+            if process is not None:
+                self.logger.warning(
+                    f"Stopping pid {pid}, instance {idx} of '{program_name}' "
+                    "is no longer in the configuration"
+                )
+                process.terminate()
+
+    def _adopt(self, process_controller, config_hash, pid, start_ticks):
+        """Supervise the saved process of an instance if it still runs"""
+        process = self.state.adopt(pid, start_ticks)
+        if process is None:
+            return False
+        self.logger.info(f"Adopting process '{process_controller.name}' with pid {pid}")
+        process_controller.adopt(process)
+        # Its output pipes died with the previous daemon
+        if config_hash != spawn_hash(process_controller.config) or any(
+            process_controller.uses_pipe(stream_type)
+            for stream_type in ("stdout", "stderr")
+        ):
+            self.logger.info(
+                f"Process '{process_controller.name}' runs with another "
+                "configuration, restarting"
+            )
+            process_controller.restart()
+        return True
 
     def _start_monitoring(self):
         """Start monitoring all active processes"""
         self._monitoring = True
         self.logger.info(f"Starting monitoring all actives processes")
-        self.monitor_thread = threading.Thread(target=self._monitor)
-        self.monitor_thread.start()
-
-    def _monitor(self):
-        while self._monitoring is True:
-            for process_list in self.processes.values():
-                for process_controller in process_list:
-                    if process_controller.monitor is False:
-                        continue
-                    return_code = process_controller.process.poll()
-                    if return_code is not None:
-                        autorestart = process_controller.config.get(
-                            "autorestart", "unexpected"
-                        )
-                        exitcodes = process_controller.config.get("exitcodes", [0])
-                        process_name = process_controller.name
-                        if autorestart == "always" or (
-                            autorestart == "unexpected" and return_code not in exitcodes
-                        ):
-                            self.logger.info(
-                                f"\nProcess '{process_name}' exited with code {return_code}. Restarting...",
-                            )
-                            process_controller.restart()
-                            self.logger.redisplay_cli_prompt()
-                        else:
-                            self.logger.info(
-                                f"\nProcess '{process_name}' exited with code {return_code}. stopping.",
-                            )
-                            process_controller.monitor = False
-                            process_controller.terminate_process()
-                            self.logger.redisplay_cli_prompt()
-            time.sleep(1)
-
-    def display_process_config(self, arg):
-        if arg in self.processes:
-            for process_controller in self.processes[arg]:
-                self.logger.info(f"Process '{arg}':")
-                self.logger.info(json.dumps(process_controller.config, indent=4))
+        self.event_loop.start()
+        self.sampler.start()
+
+    def close(self):
+        """Stop the event loop, processes are left as they are"""
+        self._monitoring = False
+        self.sampler.stop()
+        self.event_loop.stop()
+        # Templates exit, the instances they forked keep running
+        for zygote in self.zygotes.values():
+            zygote.close()
+
+    def detach(self):
+        """Stop supervising and leave every process running, for the next
+        taskmaster started with the same state file to adopt"""
+        self.close()
+        self.save_state()
+
+    def save_state(self):
+        """Write the running instances to the state file, if there is one"""
+        if self.state is not None:
+            self.event_loop.run_sync(self._save_state)
+
+    def _save_state_periodically(self):
+        self._save_state(only_changed=True)
+        self.event_loop.loop.call_later(
+            STATE_SAVE_INTERVAL, self._save_state_periodically
+        )
+
+    def _save_state(self, only_changed=False):
+        running = [
+            (program_name, idx, process_controller)
+            for program_name, process_list in list(self.processes.items())
+            for idx, process_controller in enumerate(list(process_list))
+            if process_controller.process is not None
+            and process_controller.process.returncode is None
+        ]
+        signature = [
+            (
+                program_name,
+                idx,
+                process_controller.process.pid,
+                id(process_controller.config),
+            )
+            for program_name, idx, process_controller in running
+        ]
+        if only_changed and signature == self._saved_signature:
+            return
+        self._saved_signature = signature
+        programs = {}
+        for program_name, idx, process_controller in running:
+            start_ticks = read_start_time(process_controller.process.pid)
+            if start_ticks is None:
+                continue
+            if program_name not in programs:
+                programs[program_name] = (spawn_hash(process_controller.config), [])
+            programs[program_name][1].append(
+                (idx, process_controller.process.pid, start_ticks)
+            )
+        self.state.save(programs)
+
+    def _on_process_exit(self, process_controller, return_code):
+        """Called from the event loop as soon as a monitored process exits"""
+        if self._monitoring is False:
+            return
+        autorestart = process_controller.config.get("autorestart", "unexpected")
+        exitcodes = process_controller.config.get("exitcodes", [0])
+        process_name = process_controller.name
+        if (
+            process_controller.liveness_killed
+            or autorestart == "always"
+            or (autorestart == "unexpected" and return_code not in exitcodes)
+        ):
+            self.logger.info(
+                "\nProcess '%s' exited with code %s. Restarting...",
+                process_name,
+                return_code,
+            )
+            # Scheduled on the loop with a backoff, never a stop and start inline
+            process_controller.schedule_restart()
+            self.logger.redisplay_cli_prompt()
         else:
-            self.logger.warning(f"Process '{arg}' not found in configuration")
+            self.logger.info(
+                "\nProcess '%s' exited with code %s. stopping.",
+                process_name,
+                return_code,
+            )
+            process_controller.monitor = False
+            process_controller.terminate_process()
+            self.logger.redisplay_cli_prompt()
+
+    def display_process_config(self, arg, stdout=None):
+        """Print the config of every instance of a program, False if unknown"""
+        if arg not in self.processes:
+            return False
+        for process_controller in self.processes[arg]:
+            print(f"Process '{arg}':", file=stdout)
+            print(json.dumps(process_controller.config, indent=4), file=stdout)
+        return True
+
+    def _all_controllers(self):
+        # Copies, the sampler calls this from the loop while a reload may run
+        return [
+            process_controller
+            for process_list in list(self.processes.values())
+            for process_controller in list(process_list)
+        ]
+
+    def _program_lock(self, program_name):
+        lock = self._locks.get(program_name)
+        if lock is None:
+            lock = self._locks[program_name] = asyncio.Lock()
+        return lock
+
+    async def _run_unlocked(self, operations, semaphore):
+        async def run(action, process_controller):
+            async with semaphore:
+                future = getattr(process_controller, action)()
+                return process_controller.name, await asyncio.wrap_future(future)
+
+        return await asyncio.gather(*(run(*op) for op in operations))
+
+    async def _run_bulk(self, operations):
+        # At most self.parallelism operations in flight, each program under its
+        # own lock so that a later command on it waits for this one
+        semaphore = asyncio.Semaphore(self.parallelism)
+        by_program = {}
+        for action, process_controller in operations:
+            by_program.setdefault(process_controller.program, []).append(
+                (action, process_controller)
+            )
+
+        async def run_program(program_name, program_operations):
+            async with self._program_lock(program_name):
+                # A reload that ran while we waited may have removed instances
+                current = set(map(id, self.processes.get(program_name, ())))
+                return await self._run_unlocked(
+                    [op for op in program_operations if id(op[1]) in current],
+                    semaphore,
+                )
+
+        results = await asyncio.gather(
+            *(run_program(*item) for item in by_program.items())
+        )
+        return dict(pair for program_results in results for pair in program_results)
+
+    def run_bulk(self, action, process_controllers, label):
+        """Run start, stop or restart on many processes at once.
+
+        Blocks until every operation finished and returns a {name: bool} summary.
+        Must not be called from the event loop thread.
+        """
+        return self.run_operations(
+            [(action, process_controller) for process_controller in process_controllers],
+            label,
+        )
+
+    def run_operations(self, operations, label):
+        """Like run_bulk, for a list of (action, process_controller) pairs"""
+        if not operations:
+            return {}
+        results = self.event_loop.run_coroutine(self._run_bulk(operations)).result()
+        self._log_results(results, label)
+        return results
+
+    def _log_results(self, results, label):
+        if not results:
+            return
+        failed = [name for name, succeeded in results.items() if not succeeded]
+        summary = f"{label}: {len(results) - len(failed)}/{len(results)} succeeded"
+        if failed:
+            self.logger.warning(f"{summary}, failed: {', '.join(failed)}")
+        else:
+            self.logger.info(summary)
 
     def start_all(self):
         self._monitoring = True
-        for process_list in self.processes.values():
-            for process_controller in process_list:
-                process_controller.start()
+        return self.run_bulk("start", self._all_controllers(), "Start all")
 
     def stop_all(self):
         self._monitoring = False
-        for process_list in self.processes.values():
-            for process_controller in process_list:
-                if process_controller.is_active():
-                    process_controller.stop()
+        # Instances in backoff or waiting for their zygote have no live process
+        # but a pending spawn, stopping them cancels it
+        process_controllers = [
+            process_controller
+            for process_controller in self._all_controllers()
+            if process_controller.state not in (STOPPED, EXITED, FATAL)
+        ]
+        results = self.run_bulk("stop", process_controllers, "Stop all")
+        self.save_state()
+        return results
 
     def restart_all(self):
         self._monitoring = False
-        for process_list in self.processes.values():
-            for process_controller in process_list:
-                process_controller.restart()
+        results = self.run_bulk("restart", self._all_controllers(), "Restart all")
         self._monitoring = True
+        return results
 
     def start_process(self, process_name):
-        if process_name in self.processes:
-            for process_controller in self.processes[process_name]:
-                process_controller.start()
-        else:
-            self.logger.warning(f"Process '{process_name}' not found in configuration")
+        # None for an unknown program, the shell reports it
+        process_list = self.processes.get(process_name)
+        if process_list is not None:
+            return self.run_bulk(
+                "start", process_list, f"Start '{process_name}'"
+            )
 
     def stop_process(self, process_name):
-        if process_name in self.processes:
-            for process_controller in self.processes[process_name]:
-                process_controller.stop()
-        else:
-            self.logger.warning(f"Process '{process_name}' not found in configuration")
+        # None for an unknown program, the shell reports it
+        process_list = self.processes.get(process_name)
+        if process_list is not None:
+            return self.run_bulk(
+                "stop", process_list, f"Stop '{process_name}'"
+            )
 
     def restart_process(self, process_name):
-        if process_name in self.processes:
-            for process_controller in self.processes[process_name]:
-                process_controller.restart()
-        else:
-            self.logger.warning(f"Process '{process_name}' not found in configuration")
+        # None for an unknown program, the shell reports it
+        process_list = self.processes.get(process_name)
+        if process_list is not None:
+            return self.run_bulk(
+                "restart", process_list, f"Restart '{process_name}'"
+            )
 
     def reload_configuration(self, arg=None):
         self.logger.info("Reloading configuration")
@@ -142,95 +409,239 @@ class ProcessManager:
                 new_config = Config(self.config_path)
         except Exception as e:
             self.logger.error(f"Error while reloading configuration: {e}")
-            return
+            return False
 
-        if not new_config["programs"]:
+        new_programs = new_config["programs"] or {}
+        if not new_programs:
             self.logger.error("No program found in configuration file")
-            new_program_names = set()
-        else:
-            new_program_names = set(new_config["programs"].keys())
-        old_program_names = set(self.processes.keys())
-
-        self.remove_old_config_programs(old_program_names, new_program_names)
-        self.add_new_config_programs(new_config, new_program_names, old_program_names)
-        self.update_existing_programs(new_config, old_program_names, new_program_names)
+        self.event_loop.run_coroutine(self._reload(new_programs)).result()
 
         self.logger.info("Configuration reloaded.")
+        return True
 
-    def remove_old_config_programs(self, old_program_names, new_program_names):
-        for program_name in old_program_names - new_program_names:
-            self.stop_process(program_name)
-            del self.processes[program_name]
-
-    def add_new_config_programs(self, new_config, new_program_names, old_program_names):
-        for program_name in new_program_names - old_program_names:
-            program_config = new_config["programs"][program_name]
-            self.processes[program_name] = []
-            for i in range(program_config["numprocs"]):
-                process_name = (
-                    f"{program_name}_{i}"
-                    if program_config["numprocs"] > 1
-                    else program_name
-                )
-                process_controller = ProcessController(
-                    name=process_name, config=program_config, logger=self.logger
-                )
-                self.processes[program_name].append(process_controller)
-                process_controller.start()
+    async def _reload(self, new_programs):
+        # Reloads run one at a time, each plans against the result of the last
+        if self._reload_lock is None:
+            self._reload_lock = asyncio.Lock()
+        async with self._reload_lock:
+            old_programs = {
+                program_name: process_list[0].config
+                for program_name, process_list in self.processes.items()
+                if process_list
+            }
+            plan = ReloadPlan(old_programs, new_programs)
+            self.logger.debug("Reload plan: %s", plan)
+            affected = sorted(set(plan.removed + plan.added + plan.changed))
+            # Always taken in sorted order, nothing else holds two locks
+            locks = [self._program_lock(program_name) for program_name in affected]
+            for lock in locks:
+                await lock.acquire()
+            try:
+                await self.apply_reload_plan(plan, new_programs)
+            finally:
+                for lock in locks:
+                    lock.release()
+                for program_name in plan.removed:
+                    self._locks.pop(program_name, None)
 
-    def update_existing_programs(
-        self, new_config, old_program_names, new_program_names
-    ):
-        for program_name in old_program_names & new_program_names:
-            old_program_config = self.processes[program_name][0].config
-            new_program_config = new_config["programs"][program_name]
-            if self.is_config_different(old_program_config, new_program_config):
-                self.logger.debug(f"Configuration changed for program: {program_name}")
-                old_program_numprocs = old_program_config["numprocs"]
-                new_program_numprocs = new_program_config["numprocs"]
-                if new_program_numprocs > old_program_numprocs:
-                    # update config for existing processes
-                    for process_controller in self.processes[program_name]:
-                        process_controller.config = new_program_config
-                    self.restart_process(program_name)
-                    # add new processes
-                    for i in range(old_program_numprocs, new_program_numprocs):
-                        process_name = f"{program_name}_{i}"
-                        process_controller = ProcessController(
-                            name=process_name,
-                            config=new_program_config,
-                            logger=self.logger,
-                        )
-                        self.processes[program_name].append(process_controller)
-                        process_controller.start()
-                elif new_program_numprocs < old_program_numprocs:
-                    # stop and remove processes
-                    for i in range(old_program_numprocs, new_program_numprocs, -1):
-                        process_controller = self.processes[program_name][i - 1]
-                        process_controller.stop()
-                        del self.processes[program_name][i - 1]
-                    # update config for existing processes
-                    for i in range(new_program_numprocs):
-                        process_controller = self.processes[program_name][i]
-                        process_controller.config = new_program_config
-                    self.restart_process(program_name)
+    async def apply_reload_plan(self, plan, new_programs):
+        """Touch only the instances a configuration change really affects.
+
+        Runs on the loop with the lock of every affected program held.
+        """
+        stops, restarts, starts = [], [], []
+        # Closed once the instances they forked are stopped
+        old_zygotes = []
+        processes = dict(self.processes)
+        for program_name in plan.removed:
+            stops.extend(processes.pop(program_name))
+            old_zygotes.append(self.zygotes.pop(program_name, None))
+
+        for program_name in plan.added:
+            program_config = new_programs[program_name]
+            env = build_env(program_config)
+            processes[program_name] = self._create_instances(
+                program_name,
+                program_config,
+                0,
+                program_config["numprocs"],
+                env,
+                self._create_zygote(program_name, program_config, env),
+            )
+            if program_config["autostart"]:
+                starts.extend(processes[program_name])
+
+        for program_name in plan.changed:
+            program_config = new_programs[program_name]
+            process_list = processes[program_name]
+            old_numprocs = len(process_list)
+            new_numprocs = program_config["numprocs"]
+            self.logger.debug("Configuration changed for program: %s", program_name)
+            if new_numprocs < old_numprocs:
+                stops.extend(process_list[new_numprocs:])
+                process_list = process_list[:new_numprocs]
+            was_running = any(
+                process_controller.is_active() for process_controller in process_list
+            )
+            env = build_env(program_config)
+            zygote = self.zygotes.get(program_name)
+            if program_name in plan.restart:
+                old_zygotes.append(self.zygotes.pop(program_name, None))
+                zygote = self._create_zygote(program_name, program_config, env)
+            for idx, process_controller in enumerate(process_list):
+                process_controller.config = program_config
+                process_controller.env = env
+                process_controller.zygote = zygote
+                process_controller.name = self._instance_name(
+                    program_name, idx, new_numprocs
+                )
+                if program_name in plan.restart and (
+                    process_controller.is_active()
+                    or process_controller.state in (STARTING, BACKOFF)
+                ):
+                    restarts.append(process_controller)
                 else:
-                    for process_controller in self.processes[program_name]:
-                        process_controller.config = new_program_config
-                    self.restart_process(program_name)
+                    # A liveness probe added to a running program
+                    process_controller.watch_liveness()
+            if new_numprocs > old_numprocs:
+                new_instances = self._create_instances(
+                    program_name,
+                    program_config,
+                    old_numprocs,
+                    new_numprocs,
+                    env,
+                    zygote,
+                )
+                process_list = process_list + new_instances
+                if program_config["autostart"] or was_running:
+                    starts.extend(new_instances)
+            processes[program_name] = process_list
+        self.processes = processes
 
-    def is_config_different(self, old_config, new_config):
-        return old_config != new_config
+        semaphore = asyncio.Semaphore(self.parallelism)
+        self._log_results(
+            dict(
+                await self._run_unlocked(
+                    [("stop", process_controller) for process_controller in stops],
+                    semaphore,
+                )
+            ),
+            "Reload: stop removed instances",
+        )
+        for process_controller in stops:
+            process_controller.close_output()
+        self._log_results(
+            dict(
+                await self._run_unlocked(
+                    [("restart", process_controller) for process_controller in restarts]
+                    + [("start", process_controller) for process_controller in starts],
+                    semaphore,
+                )
+            ),
+            "Reload: restart and start instances",
+        )
+        for zygote in old_zygotes:
+            if zygote is not None:
+                zygote.close()
 
-    def status(self):
+    def status(self, stdout=None):
+        """Print the state of every instance, to sys.stdout by default"""
         if not self.processes.items():
-            self.logger.info("No process configured")
+            print("No process configured", file=stdout)
             return
+        resources = self.sampler.latest()
         for process_name, process_list in self.processes.items():
-            self.logger.info(f"Process '{process_name}':")
+            print(f"Process '{process_name}':", file=stdout)
             for idx, process_controller in enumerate(process_list):
                 status = process_controller.status()
-                self.logger.info(f"  {process_controller.name}: {status}")
+                sample = resources.get(process_controller)
+                if sample is not None and process_controller.is_active():
+                    status += f" ({self._format_sample(sample)})"
+                print(f"  {process_controller.name}: {status}", file=stdout)
+
+    def _format_sample(self, sample):
+        cpu = "-" if sample["cpu_percent"] is None else f"{sample['cpu_percent']}%"
+        fds = "-" if sample["fds"] is None else sample["fds"]
+        return (
+            f"cpu {cpu}, rss {sample['rss'] / (1024 * 1024):.1f} MiB, "
+            f"threads {sample['threads']}, fds {fds}"
+        )
+
+    def _select_programs(self, program_names):
+        # Copies, so a concurrent reload cannot change what we iterate over
+        processes = dict(self.processes)
+        if not program_names:
+            return processes
+        for program_name in program_names:
+            if program_name not in processes:
+                raise ValueError(f"Process '{program_name}' not found in configuration")
+        return {program_name: processes[program_name] for program_name in program_names}
+
+    def query_status(self, program_names=None):
+        """Status, pid, uptime, exit code and last resource sample of every instance"""
+        results = []
+        resources = self.sampler.latest()
+        for program_name, process_list in self._select_programs(program_names).items():
+            for instance, process_controller in enumerate(list(process_list)):
+                info = process_controller.info()
+                info["program"] = program_name
+                info["instance"] = instance
+                sample = resources.get(process_controller) or {}
+                for key in ("cpu_percent", "rss", "threads", "fds"):
+                    info[key] = sample.get(key)
+                results.append(info)
+        return results
+
+    def query_resources(self, program_names=None):
+        """Kept resource samples of every instance, oldest first, keyed by name"""
+        return {
+            process_controller.name: self.sampler.history(process_controller)
+            for process_list in self._select_programs(program_names).values()
+            for process_controller in list(process_list)
+        }
+
+    def query_config(self, program_names=None):
+        """Configuration of every program as a dict keyed by program name"""
+        return {
+            program_name: process_list[0].config
+            for program_name, process_list in self._select_programs(
+                program_names
+            ).items()
+            if process_list
+        }
+
+    def _select_instances(self, process_name, instance_number=None):
+        if process_name not in self.processes:
+            raise ValueError(f"Process '{process_name}' not found in configuration")
+        process_list = list(self.processes[process_name])
+        if instance_number is None:
+            return process_list
+        if not 0 <= instance_number < len(process_list):
+            raise ValueError(
+                f"Instance {instance_number} not found for process '{process_name}'"
+            )
+        return [process_list[instance_number]]
+
+    def read_output(self, process_name, instance_number=None, stream_type="stdout"):
+        """Last output of one or every instance of a program as [(name, bytes)]"""
+        try:
+            process_list = self._select_instances(process_name, instance_number)
+        except ValueError as e:
+            self.logger.warning(str(e))
+            return []
+        return [
+            (process_controller.name, process_controller.read_output(stream_type))
+            for process_controller in process_list
+        ]
+
+    def output_files(self, process_name, instance_number=None):
+        """[(name, stream_type, path)] of the output files of a program"""
+        return [
+            (process_controller.name, stream_type, process_controller.config[stream_type])
+            for process_controller in self._select_instances(process_name, instance_number)
+            for stream_type in ("stdout", "stderr")
+            if process_controller.config.get(stream_type) not in (None, os.devnull)
+        ]
 
     def attach_instance(self, process_name, instance_number=None):
         if process_name in self.processes:
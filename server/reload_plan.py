@@ -0,0 +1,71 @@
+import hashlib
+import json
+
+# Settings that are only read when the process is spawned, changing one of them
+# means the running instances have to be restarted. Every other setting
+# (autorestart, exitcodes, stoptime, ...) is read when needed and applies live.
+RESTART_KEYS = (
+    "cmd",
+    "env",
+    "workingdir",
+    "umask",
+    "stdout",
+    "stderr",
+    "capture",
+    "stdout_maxbytes",
+    "stdout_backups",
+    "stderr_maxbytes",
+    "stderr_backups",
+    "zygote",
+    "preload",
+)
+
+
+def spawn_hash(program_config):
+    """Digest of the settings a running instance was spawned with"""
+    spawn_settings = {key: program_config.get(key) for key in RESTART_KEYS}
+    return hashlib.sha1(
+        json.dumps(spawn_settings, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+
+
+class ReloadPlan:
+    """Sort the differences between two sets of program configs by how to apply them"""
+
+    def __init__(self, old_programs, new_programs):
+        old_names = set(old_programs)
+        new_names = set(new_programs)
+        self.removed = sorted(old_names - new_names)
+        self.added = sorted(new_names - old_names)
+        self.restart = []
+        self.live = []
+        self.scaled = {}
+        for program_name in sorted(old_names & new_names):
+            old_config = old_programs[program_name]
+            new_config = new_programs[program_name]
+            if old_config == new_config:
+                continue
+            if any(old_config.get(key) != new_config.get(key) for key in RESTART_KEYS):
+                self.restart.append(program_name)
+            else:
+                self.live.append(program_name)
+            if old_config["numprocs"] != new_config["numprocs"]:
+                self.scaled[program_name] = (
+                    old_config["numprocs"],
+                    new_config["numprocs"],
+                )
+
+    @property
+    def changed(self):
+        return self.restart + self.live
+
+    def __repr__(self):
+        return (
+            f"ReloadPlan(added={self.added}, removed={self.removed}, "
+            f"restart={self.restart}, live={self.live}, scaled={self.scaled})"
+        )
+
+
+if __name__ == "__main__":
+    print("This module is not meant to be run directly.")
+    print("Please run main.py instead.")
@@ -1,53 +1,332 @@
+import asyncio
+import concurrent.futures
+import json
+import os
 import socket
-import threading
+import stat
+import struct
+import time
 from server.control_shell import ControlShell
+from server.metrics import metrics
+from server.output import FileFollower
+
+# Frames are single JSON documents terminated by a newline
+MAX_FRAME_SIZE = 1024 * 1024
+TAIL_CHUNK_SIZE = 16 * 1024
+TAIL_POLL_INTERVAL = 0.2
+REFUSED_READ_TIMEOUT = 1
+# struct ucred: pid, uid, gid
+PEERCRED_FORMAT = "3i"
+
+
+def encode_frame(message):
+    return json.dumps(message).encode() + b"\n"
 
 
 class TaskMasterServer:
-    def __init__(self, process_manager, logger, host="localhost", port=9001):
+    def __init__(
+        self,
+        process_manager,
+        logger,
+        host="localhost",
+        port=9001,
+        socket_path=None,
+        allowed_uids=(),
+        allowed_gids=(),
+    ):
         self.process_manager = process_manager
         self.logger = logger
         self.host = host
+        # None or 0 disables the TCP listener
         self.port = port
+        self.socket_path = socket_path
+        # Root and our own user are always allowed on the Unix socket
+        self.allowed_uids = {0, os.getuid(), *allowed_uids}
+        self.allowed_gids = set(allowed_gids)
         self.control_shell = ControlShell(process_manager=process_manager, logger=logger, server=self)
-        self.server_socket = None
-        self.client_socket = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=8, thread_name_prefix="taskmaster-command"
+        )
+        self.queries = {
+            "status": process_manager.query_status,
+            "config": process_manager.query_config,
+            "resources": process_manager.query_resources,
+        }
+        self.loop = None
+        self.servers = []
+        self.clients = {}
+        self.busy_clients = set()
+        self.streams = {}
         self.is_running = True
 
     def start(self):
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen()
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        if self.port:
+            self.servers.append(
+                await asyncio.start_server(
+                    self.handle_client, self.host, self.port, limit=MAX_FRAME_SIZE
+                )
+            )
+            self.logger.info(f"TaskMaster server listening on {self.host}:{self.port}")
+        if self.socket_path:
+            self.servers.append(await self._start_unix_server())
+            self.logger.info(f"TaskMaster server listening on {self.socket_path}")
+        if not self.servers:
+            raise ValueError("No TCP port nor Unix socket to listen on")
+        # Each returns once its server is closed
+        await asyncio.gather(
+            *(server.serve_forever() for server in self.servers),
+            return_exceptions=True,
+        )
+        # Let clients that were waiting on a command receive their reply
+        await asyncio.gather(*self.clients.values(), return_exceptions=True)
+        for server in self.servers:
+            await server.wait_closed()
+        if self.socket_path:
+            self._remove_socket()
+        self.executor.shutdown(wait=False)
+        self.logger.info("TaskMaster server stopped.")
+
+    async def _start_unix_server(self):
+        self._remove_stale_socket()
+        # Peer credentials decide who gets in, the mode only keeps others from
+        # connecting when nobody else is allowed
+        shared = self.allowed_uids - {0, os.getuid()} or self.allowed_gids
+        mode = 0o666 if shared else 0o600
+        # Set before listening, nobody can connect while it has the umask mode.
+        # The umask itself is left alone, other threads create files too.
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.socket_path)
+            os.chmod(self.socket_path, mode)
+            sock.listen(socket.SOMAXCONN)
+        except OSError:
+            sock.close()
+            raise
+        return await asyncio.start_unix_server(
+            self.handle_unix_client, sock=sock, limit=MAX_FRAME_SIZE
+        )
 
-        self.logger.info(f"TaskMaster server listening on {self.host}:{self.port}")
+    def _remove_stale_socket(self):
+        try:
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                raise ValueError(f"'{self.socket_path}' exists and is not a socket")
+        except FileNotFoundError:
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Left behind by a daemon that did not exit cleanly
+                os.unlink(self.socket_path)
+                return
+        raise ValueError(f"Another server is listening on '{self.socket_path}'")
 
-        while self.is_running:
-            client_socket, addr = self.server_socket.accept()
-            self.logger.info(f"Accepted connection from {addr}")
-            threading.Thread(target=self.handle_client, args=(client_socket,)).start()
+    def _remove_socket(self):
+        try:
+            os.unlink(self.socket_path)
+        except OSError as e:
+            self.logger.warning(f"Failed to remove socket '{self.socket_path}': {e}")
 
     def stop(self):
         self.is_running = False
-        if self.server_socket is not None:
-            self.server_socket.shutdown(socket.SHUT_RDWR)
-            self.server_socket.close()
-            self.logger.info("TaskMaster server stopped.")
+        if self.loop is not None and self.servers:
+            self.loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        for server in self.servers:
+            server.close()
+        # Clients waiting on a command get their reply before being closed
+        for writer in self.clients.keys() - self.busy_clients:
+            writer.close()
 
-    def handle_client(self, client_socket):
+    def peer_allowed(self, sock):
+        """Check the uid and gid of the process on the other end of a Unix socket"""
+        creds = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize(PEERCRED_FORMAT)
+        )
+        pid, uid, gid = struct.unpack(PEERCRED_FORMAT, creds)
+        if uid in self.allowed_uids or gid in self.allowed_gids:
+            return True
+        self.logger.warning(
+            "Refused connection on %s from pid %s (uid %s, gid %s)",
+            self.socket_path,
+            pid,
+            uid,
+            gid,
+        )
+        return False
+
+    async def handle_unix_client(self, reader, writer):
+        if not self.peer_allowed(writer.get_extra_info("socket")):
+            # Answer the first request, a client writing to an already closed
+            # socket would only see a broken pipe
+            try:
+                await asyncio.wait_for(reader.readline(), REFUSED_READ_TIMEOUT)
+                writer.write(encode_frame({"ok": False, "error": "Permission denied"}))
+            except (asyncio.TimeoutError, ValueError, ConnectionError):
+                pass
+            writer.close()
+            return
+        await self.handle_client(reader, writer)
+
+    async def handle_client(self, reader, writer):
+        client_addr = writer.get_extra_info("peername") or self.socket_path
+        self.logger.info("Accepted connection from %s", client_addr)
+        self.clients[writer] = asyncio.current_task()
+        self.streams[writer] = {}
         try:
-            client_addr = client_socket.getpeername()
             while self.is_running:
-                data = client_socket.recv(1024)
-                if not data:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(
+                        encode_frame({"ok": False, "error": "Frame too large"})
+                    )
+                    break
+                if not line:
                     break
-                command = data.decode().strip()
-                self.logger.info(f"Received command: {command}")
-                response = self.control_shell.onecmd(command)
+                self.busy_clients.add(writer)
+                try:
+                    response = await self.handle_frame(line, writer)
+                finally:
+                    self.busy_clients.discard(writer)
                 if response is not None:
-                    client_socket.sendall(response.encode())
-                else:
-                    client_socket.sendall("No response from the server.".encode())
+                    writer.write(encode_frame(response))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for task in self.streams.pop(writer).values():
+                task.cancel()
+            self.clients.pop(writer, None)
+            writer.close()
+            self.logger.info("Closed connection to %s", client_addr)
+
+    async def handle_frame(self, line, writer):
+        try:
+            request = json.loads(line)
+            if "cancel" in request:
+                return self.cancel_stream(request, writer)
+            if "query" in request:
+                start = time.monotonic()
+                response = self.handle_query(request)
+                query = request["query"] if request["query"] in self.queries else "unknown"
+                metrics.command_duration.observe(
+                    time.monotonic() - start, f"query {query}"
+                )
+                return response
+            command = request["command"].strip()
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {"ok": False, "error": "Invalid frame"}
+        response = {"id": request.get("id")}
+        self.logger.info("Received command: %s", command)
+        if command.split()[:2] == ["tail", "-f"]:
+            return self.start_tail(request, command.split()[2:], writer)
+        start = time.monotonic()
+        try:
+            succeeded, output = await self.loop.run_in_executor(
+                self.executor, self.control_shell.run_command, command
+            )
+        except Exception as e:
+            response.update(ok=False, error=str(e))
+            return response
+        finally:
+            # Labelled by known verbs only, anything else would make the
+            # number of series unbounded
+            verb = command.split()[0] if command else ""
+            if not hasattr(self.control_shell, f"do_{verb}"):
+                verb = "unknown"
+            metrics.command_duration.observe(time.monotonic() - start, verb)
+        if output is None:
+            output = "No response from the server."
+        if not succeeded:
+            # The output holds the error printed by the command
+            response.update(ok=False, error=output)
+            return response
+        response.update(ok=True, output=output)
+        return response
+
+    def handle_query(self, request):
+        """Answer {"query": "status", "programs": [...]} with data instead of text"""
+        response = {"id": request.get("id")}
+        query = self.queries.get(request["query"])
+        if query is None:
+            response.update(ok=False, error=f"Unknown query '{request['query']}'")
+            return response
+        try:
+            data = query(request.get("programs"))
+        except ValueError as e:
+            response.update(ok=False, error=str(e))
+            return response
+        response.update(ok=True, data=data)
+        return response
+
+    def start_tail(self, request, args, writer):
+        """Stream new output of a process until the client cancels: tail -f <process> [instance]"""
+        response = {"id": request.get("id")}
+        try:
+            if not args:
+                raise ValueError("No process name provided.")
+            instance_number = int(args[1]) if len(args) > 1 else None
+            targets = self.process_manager.output_files(args[0], instance_number)
+        except ValueError as e:
+            response.update(ok=False, error=str(e))
+            return response
+        if not targets:
+            response.update(ok=False, error=f"Process '{args[0]}' has no output file")
+            return response
+        self.streams[writer][request.get("id")] = asyncio.ensure_future(
+            self._tail(request.get("id"), targets, writer)
+        )
+        return None
+
+    def cancel_stream(self, request, writer):
+        """Stop the stream started by the request {"cancel": <id>}, it sends the final reply"""
+        task = self.streams[writer].pop(request["cancel"], None)
+        if task is not None:
+            task.cancel()
+        return None
+
+    async def _tail(self, request_id, targets, writer):
+        followers = [
+            (name, stream_type, FileFollower(path))
+            for name, stream_type, path in targets
+        ]
+        try:
+            while True:
+                sent = False
+                for name, stream_type, follower in followers:
+                    data = follower.read(TAIL_CHUNK_SIZE)
+                    if not data:
+                        continue
+                    writer.write(
+                        encode_frame(
+                            {
+                                "id": request_id,
+                                "stream": stream_type,
+                                "name": name,
+                                "data": data,
+                            }
+                        )
+                    )
+                    # A slow client only holds back its own stream, the file
+                    # offset keeps our place while we wait
+                    await writer.drain()
+                    sent = True
+                if not sent:
+                    await asyncio.sleep(TAIL_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            if not writer.is_closing():
+                writer.write(
+                    encode_frame({"id": request_id, "ok": True, "output": "Tail stopped."})
+                )
+        except ConnectionError:
+            pass
         finally:
-            client_socket.close()
-            self.logger.info(f"Closed connection to {client_addr}")
+            self.streams.get(writer, {}).pop(request_id, None)
+            for _, _, follower in followers:
+                follower.close()
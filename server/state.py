@@ -0,0 +1,118 @@
+import json
+import os
+import signal
+import time
+
+from server.proc_sampler import CLOCK_TICKS, read_start_time
+
+STATE_VERSION = 1
+# Exit code reported for an adopted process, only its parent can read the real one
+ADOPTED_EXIT_CODE = 255
+
+
+def process_age(start_ticks):
+    """Seconds since a process started, from its start time in clock ticks"""
+    try:
+        with open("/proc/uptime") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+    except OSError:
+        return 0.0
+    return max(0.0, uptime - start_ticks / CLOCK_TICKS)
+
+
+class AdoptedProcess:
+    """Popen-like handle on a process spawned by a previous taskmaster.
+
+    It is not our child, so it cannot be waited for. It is identified by its
+    pid and its start time, a recycled pid never matches both.
+    """
+
+    def __init__(self, pid, start_ticks):
+        self.pid = pid
+        self.start_ticks = start_ticks
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None and read_start_time(self.pid) != self.start_ticks:
+            self.returncode = ADOPTED_EXIT_CODE
+        return self.returncode
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"pid {self.pid} still running")
+            time.sleep(0.05)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.poll() is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class StateSnapshot:
+    """Running instances saved to a JSON file, to adopt them after a restart.
+
+    {"version": 1, "programs": {name: {"hash": spawn hash,
+    "instances": [[index, pid, start ticks], ...]}}}
+    """
+
+    def __init__(self, path, logger):
+        self.path = path
+        self.logger = logger
+
+    def save(self, programs):
+        """Write {name: (hash, [(index, pid, start_ticks)])} atomically"""
+        state = {
+            "version": STATE_VERSION,
+            "programs": {
+                program_name: {"hash": config_hash, "instances": instances}
+                for program_name, (config_hash, instances) in programs.items()
+                if instances
+            },
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as state_file:
+                json.dump(state, state_file, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Failed to write state file '{self.path}': {e}")
+
+    def load(self):
+        """{(program, index): (hash, pid, start_ticks)} of the saved instances"""
+        try:
+            with open(self.path) as state_file:
+                state = json.load(state_file)
+            if state.get("version") != STATE_VERSION:
+                raise ValueError(f"unsupported version {state.get('version')}")
+            return {
+                (program_name, index): (program["hash"], pid, start_ticks)
+                for program_name, program in state["programs"].items()
+                for index, pid, start_ticks in program["instances"]
+            }
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.logger.warning(f"Ignoring state file '{self.path}': {e}")
+            return {}
+
+    def adopt(self, pid, start_ticks):
+        """Handle on the saved process if it still runs, None otherwise"""
+        if read_start_time(pid) != start_ticks:
+            return None
+        return AdoptedProcess(pid, start_ticks)
+
+
+if __name__ == "__main__":
+    print("This module is not meant to be run directly.")
+    print("Please run main.py instead.")
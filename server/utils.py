@@ -3,6 +3,7 @@ import os
 import sys
 import pwd
 import grp
+import resource
 
 
 def drop_privileges(user, group, logger):
@@ -17,6 +18,31 @@ def drop_privileges(user, group, logger):
         logger.error(f"Erreur lors de la désescalade des privilèges : {e}")
 
 
+def raise_open_files_limit(logger):
+    # The daemon holds one pidfd per running instance
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError) as e:
+            logger.warning(f"Failed to raise the open files limit to {hard}: {e}")
+
+
+def resolve_socket_peers(users, groups):
+    """uids and gids of the comma separated user and group names or ids"""
+    uids = {
+        int(user) if user.isdigit() else pwd.getpwnam(user).pw_uid
+        for user in (users or "").split(",")
+        if user
+    }
+    gids = {
+        int(group) if group.isdigit() else grp.getgrnam(group).gr_gid
+        for group in (groups or "").split(",")
+        if group
+    }
+    return uids, gids
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Taskmaster - A job control daemon")
     parser.add_argument(
@@ -38,8 +64,8 @@ def parse_args():
     )
     parser.add_argument(
         "--smtp-config",
-        default="./config/smtp.json",
-        help="Path to the SMTP configuration file (JSON format)",
+        default=None,
+        help="Path to the SMTP configuration file (JSON format, default: no mail alerts)",
     )
     parser.add_argument(
         "--server-addr",
@@ -52,10 +78,63 @@ def parse_args():
         default=9001,
         help="Port to bind the daemon server to (default: 9001)",
     )
+    parser.add_argument(
+        "--server-socket",
+        type=str,
+        default=None,
+        help="Also listen on this Unix domain socket (default: disabled)",
+    )
+    parser.add_argument(
+        "--no-tcp",
+        action="store_true",
+        help="Do not listen on TCP, only on --server-socket",
+    )
+    parser.add_argument(
+        "--socket-users",
+        type=str,
+        default=None,
+        help="Comma separated users allowed on the Unix socket besides root and the daemon user",
+    )
+    parser.add_argument(
+        "--socket-groups",
+        type=str,
+        default=None,
+        help="Comma separated groups allowed on the Unix socket",
+    )
+    parser.add_argument(
+        "--parallelism",
+        type=int,
+        default=64,
+        help="Maximum number of processes started or stopped at once by bulk operations (default: 64)",
+    )
+    parser.add_argument(
+        "--sample-interval",
+        type=float,
+        default=5,
+        help="Seconds between two samples of process resources from /proc, 0 disables sampling (default: 5)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve Prometheus metrics over HTTP on this port (default: disabled)",
+    )
+    parser.add_argument(
+        "--metrics-addr",
+        type=str,
+        default="localhost",
+        help="Address to bind the metrics endpoint to (default: localhost)",
+    )
+    parser.add_argument(
+        "--state-file",
+        type=str,
+        default=None,
+        help="Save the running processes to this file and adopt them on the next start (default: disabled)",
+    )
     parser.add_argument(
         "--syslog-config",
-        default="./config/syslog.json",
-        help="Path to the Syslog configuration file (JSON format)",
+        default=None,
+        help="Path to the Syslog configuration file (JSON format, default: no syslog)",
     )
     parser.add_argument("--daemon", dest="server", action="store_true", help="Run as a server")
     parser.add_argument("--server", action="store_true", help="Run as a server")
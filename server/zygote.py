@@ -0,0 +1,339 @@
+import json
+import os
+import shlex
+import signal
+import subprocess
+
+from server.proc_sampler import read_start_time
+
+TEMPLATE_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "zygote_template.py"
+)
+# A fork only takes the template a few milliseconds
+FORK_TIMEOUT = 5
+READ_SIZE = 65536
+
+
+class ZygoteProcess:
+    """Popen-like handle on an instance forked by a zygote.
+
+    The template is its parent: it reaps the instance and reports the exit
+    code, which is set here before the exit callback runs.
+    """
+
+    def __init__(self, pid, start_ticks):
+        self.pid = pid
+        self.start_ticks = start_ticks
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class ReadyWaiter:
+    """Callback run once the zygote is ready or failed to start, cancellable
+    like a timer handle"""
+
+    __slots__ = ("callback",)
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def cancel(self):
+        self.callback = None
+
+    def run(self):
+        callback, self.callback = self.callback, None
+        if callback is not None:
+            callback()
+
+
+class ForkRequest:
+    """Fork of an instance waiting for the reply of the template, cancellable
+    like a timer handle. A pid received after cancel() is killed."""
+
+    __slots__ = ("on_spawned", "on_exit", "timer")
+
+    def __init__(self, on_spawned, on_exit):
+        self.on_spawned = on_spawned
+        self.on_exit = on_exit
+        self.timer = None
+
+    def cancel(self):
+        self.on_spawned = None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def finish(self, process, error):
+        on_spawned = self.on_spawned
+        self.cancel()
+        if on_spawned is not None:
+            on_spawned(process, error)
+        return on_spawned is not None
+
+
+class Zygote:
+    """Template process of a program: preloads its modules once, then forks
+    instances on request. Driven from the event loop only.
+    """
+
+    def __init__(self, name, config, env, logger, event_loop):
+        self.name = name
+        self.config = config
+        self.env = env
+        self.logger = logger
+        self.event_loop = event_loop
+        self.process = None
+        self.ready = False
+        # pid -> (ZygoteProcess, exit callback)
+        self.children = {}
+        # request id -> ForkRequest, answered in order by the template
+        self.requests = {}
+        self._waiters = []
+        self._buffer = b""
+        self._outgoing = b""
+        self._fd = None
+        self._stdin_fd = None
+        self._next_id = 0
+        self._closing = False
+
+    def when_ready(self, callback):
+        """Run callback on the loop once the template is ready, starting it if
+        needed. Also run if it failed to start, the fork then raises."""
+        waiter = ReadyWaiter(callback)
+        if self.ready:
+            self.event_loop.call_soon(waiter.run)
+            return waiter
+        self._waiters.append(waiter)
+        if self.process is None:
+            self._start()
+        return waiter
+
+    def _start(self):
+        argv = shlex.split(self.config["cmd"])
+        settings = {"preload": self.config.get("preload", []), "argv": argv[1:]}
+        stderr = subprocess.DEVNULL
+        try:
+            # Preload errors end up with the output of the program
+            if self.config.get("stderr"):
+                stderr = open(self.config["stderr"], "a")
+            self.process = subprocess.Popen(
+                [argv[0], TEMPLATE_SCRIPT, json.dumps(settings)],
+                cwd=self.config.get("workingdir", None),
+                env=self.env,
+                umask=self.config.get("umask", 0o022),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+            )
+        except Exception as e:
+            self.logger.warning(f"Failed to start the zygote of '{self.name}': {e}")
+            self._run_waiters()
+            return
+        finally:
+            if hasattr(stderr, "close"):
+                stderr.close()
+        self._closing = False
+        self._fd = self.process.stdout.fileno()
+        os.set_blocking(self._fd, False)
+        self._stdin_fd = self.process.stdin.fileno()
+        os.set_blocking(self._stdin_fd, False)
+        self.event_loop.loop.add_reader(self._fd, self._on_readable)
+        self.event_loop.watch_child(self.process, self._on_exit)
+
+    def close(self):
+        """Let the template exit once it read the pending requests. Like when
+        it dies, the instances it forked that are still supervised are then
+        killed, nothing could report their exit anymore. A detach stops the
+        loop first, so they are left running for the next taskmaster."""
+        if self.process is not None:
+            self._closing = True
+            self._flush()
+
+    def fork(self, on_spawned, on_exit, stdout, stderr, umask):
+        """Ask the template for an instance without blocking the loop.
+
+        on_spawned(process, error) is called from the loop with the new
+        ZygoteProcess, or with an error if the fork failed or timed out.
+        on_exit(process, return_code) is called once the instance exited.
+        Returns the ForkRequest.
+        """
+        request = ForkRequest(on_spawned, on_exit)
+        if not self.ready:
+            error = RuntimeError(f"the zygote of '{self.name}' is not running")
+            self.event_loop.loop.call_soon(request.finish, None, error)
+            return request
+        self._next_id += 1
+        request_id = self._next_id
+        self.requests[request_id] = request
+        request.timer = self.event_loop.loop.call_later(
+            FORK_TIMEOUT, self._on_fork_timeout, request_id
+        )
+        message = {"id": request_id, "stdout": stdout, "stderr": stderr, "umask": umask}
+        self._outgoing += json.dumps(message).encode() + b"\n"
+        self._flush()
+        return request
+
+    def _flush(self):
+        if self._stdin_fd is None:
+            return
+        try:
+            written = os.write(self._stdin_fd, self._outgoing) if self._outgoing else 0
+        except BlockingIOError:
+            written = 0
+        except OSError:
+            # The template is gone, _on_exit fails the requests
+            self._outgoing = b""
+            return
+        self._outgoing = self._outgoing[written:]
+        if self._outgoing:
+            self.event_loop.loop.add_writer(self._stdin_fd, self._on_writable)
+        elif self._closing:
+            self._close_stdin()
+
+    def _on_writable(self):
+        self.event_loop.loop.remove_writer(self._stdin_fd)
+        self._flush()
+
+    def _close_stdin(self):
+        if self._stdin_fd is not None:
+            self.event_loop.loop.remove_writer(self._stdin_fd)
+            self.process.stdin.close()
+            self._stdin_fd = None
+
+    def _on_fork_timeout(self, request_id):
+        request = self.requests.get(request_id)
+        if request is not None:
+            # Left in requests, a late pid is killed
+            request.timer = None
+            request.finish(
+                None, TimeoutError(f"the zygote of '{self.name}' did not answer")
+            )
+
+    def _receive(self):
+        # Returns False at end of file
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return True
+        if not data:
+            return False
+        self._buffer += data
+        return True
+
+    def _pop_message(self):
+        if b"\n" not in self._buffer:
+            return None
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def _on_readable(self):
+        if not self._receive():
+            # The exit itself is handled by _on_exit
+            self.event_loop.loop.remove_reader(self._fd)
+        while (message := self._pop_message()) is not None:
+            self._handle(message)
+
+    def _handle(self, message):
+        if message.get("ready"):
+            self.ready = True
+            self.logger.info(f"Zygote of '{self.name}' is ready")
+            self._run_waiters()
+        elif "id" in message:
+            self._on_forked(message)
+        elif "exit" in message:
+            process, on_exit = self.children.pop(message["exit"], (None, None))
+            if process is not None:
+                self._report_exit(process, on_exit, message["code"])
+
+    def _on_forked(self, message):
+        request = self.requests.pop(message["id"], None)
+        if request is None:
+            return
+        if "error" in message:
+            request.finish(None, OSError(message["error"]))
+            return
+        pid = message["pid"]
+        process = ZygoteProcess(pid, read_start_time(pid))
+        if request.on_spawned is None:
+            # Cancelled or timed out meanwhile, nobody supervises it
+            self.logger.warning(
+                f"Killing instance {pid} of '{self.name}', its start was cancelled"
+            )
+            process.kill()
+            return
+        # Registered first, the exit is reported after this reply
+        self.children[pid] = (process, request.on_exit)
+        request.finish(process, None)
+
+    def _report_exit(self, process, on_exit, return_code):
+        process.returncode = return_code
+        try:
+            on_exit(process, return_code)
+        except Exception as e:
+            self.logger.error("Error while handling exit of pid %s: %s", process.pid, e)
+
+    def _run_waiters(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter.run()
+
+    def _on_exit(self, process, return_code):
+        if process is not self.process:
+            return
+        self.event_loop.loop.remove_reader(self._fd)
+        # Exits reported just before the template died
+        try:
+            while data := os.read(self._fd, READ_SIZE):
+                self._buffer += data
+        except BlockingIOError:
+            pass
+        while (message := self._pop_message()) is not None:
+            self._handle(message)
+        self._close_stdin()
+        process.stdout.close()
+        self.process = None
+        self.ready = False
+        self._buffer = b""
+        self._outgoing = b""
+        self._fd = None
+        if not self._closing:
+            self.logger.warning(
+                f"Zygote of '{self.name}' exited with code {return_code}"
+            )
+        # Nothing can report the exit of its orphans anymore
+        children, self.children = self.children, {}
+        for pid, (child, on_exit) in children.items():
+            # Unknown start times (None) mean the child is already gone
+            if (
+                child.start_ticks is not None
+                and read_start_time(pid) == child.start_ticks
+            ):
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            self._report_exit(child, on_exit, -signal.SIGKILL)
+        requests, self.requests = self.requests, {}
+        for request in requests.values():
+            request.finish(None, RuntimeError(f"the zygote of '{self.name}' exited"))
+        self._run_waiters()
+
+
+if __name__ == "__main__":
+    print("This module is not meant to be run directly.")
+    print("Please run main.py instead.")
@@ -0,0 +1,151 @@
+"""Template process of a zygote program, started by server/zygote.py.
+
+    python zygote_template.py '{"preload": [...], "argv": [...]}'
+
+Imports the preload modules once, then forks an instance for each request
+read on stdin and reports it with its exit code on stdout, one JSON document
+per line. argv is the program command without the interpreter: either
+"-m module args..." or "script.py args...". Only the standard library is
+used, the template runs with the interpreter of the program.
+"""
+import json
+import os
+import selectors
+import signal
+import sys
+
+
+def send(control_out, message):
+    os.write(control_out, json.dumps(message).encode() + b"\n")
+
+
+def redirect(path, fd, umask):
+    target = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666 & ~umask)
+    os.dup2(target, fd)
+    os.close(target)
+
+
+def run_instance(request, argv, inherited_fds):
+    """Body of a forked instance, never returns"""
+    import runpy
+    import traceback
+
+    code = 1
+    try:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        for fd in inherited_fds:
+            os.close(fd)
+        # stdin is already /dev/null
+        os.umask(request["umask"])
+        redirect(request["stdout"] or os.devnull, 1, request["umask"])
+        redirect(request["stderr"] or os.devnull, 2, request["umask"])
+        try:
+            if argv[0] == "-m":
+                sys.argv = argv[1:]
+                runpy.run_module(argv[1], run_name="__main__", alter_sys=True)
+            else:
+                sys.argv = list(argv)
+                runpy.run_path(argv[0], run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+        except BaseException:
+            traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def exit_code(status):
+    # The template runs with the interpreter of the program, which may be
+    # older than waitstatus_to_exitcode (3.9)
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def reap(control_out):
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        send(control_out, {"exit": pid, "code": exit_code(status)})
+
+
+def main():
+    settings = json.loads(sys.argv[1])
+    argv = settings["argv"]
+    # Resolve imports like "python -m" (working directory) or "python script.py"
+    if argv[0] == "-m":
+        sys.path[0] = os.getcwd()
+    else:
+        sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+
+    # stdin and stdout carry the protocol, keep them away from anything that
+    # prints while preloading
+    control_in, control_out = os.dup(0), os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+
+    import importlib
+
+    for module in settings["preload"]:
+        importlib.import_module(module)
+
+    wakeup_in, wakeup_out = os.pipe()
+    os.set_blocking(wakeup_out, False)
+    signal.set_wakeup_fd(wakeup_out)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    # A Ctrl-C in the foreground shell is for the instances, not the template
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    selector = selectors.DefaultSelector()
+    selector.register(control_in, selectors.EVENT_READ)
+    selector.register(wakeup_in, selectors.EVENT_READ)
+    inherited_fds = (control_in, control_out, wakeup_in, wakeup_out, selector.fileno())
+    send(control_out, {"ready": True})
+
+    buffer = b""
+    while True:
+        for key, _ in selector.select():
+            if key.fd == wakeup_in:
+                os.read(wakeup_in, 4096)
+                reap(control_out)
+                continue
+            data = os.read(control_in, 65536)
+            if not data:
+                # Taskmaster is gone, running instances are left as they are
+                return
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                request = json.loads(line)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                try:
+                    pid = os.fork()
+                except OSError as e:
+                    send(control_out, {"id": request["id"], "error": str(e)})
+                    continue
+                if pid == 0:
+                    run_instance(request, argv, inherited_fds)
+                send(control_out, {"id": request["id"], "pid": pid})
+
+
+if __name__ == "__main__":
+    main()
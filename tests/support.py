@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks import common
+from benchmarks.common import write_config
+from server.logger import Logger
+from server.process_manager import ProcessManager
+
+
+def make_program(cmd, **overrides):
+    # Tests start their programs explicitly
+    return common.make_program(cmd, **dict({"autostart": False}, **overrides))
+
+
+class ManagerTestCase(unittest.TestCase):
+    """Runs a ProcessManager on generated configurations in a temporary directory"""
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+        self.logger = Logger(
+            "TaskMasterTest",
+            log_file=os.path.join(self.directory, "taskmaster.log"),
+            log_level="CRITICAL",
+        )
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.stop_all()
+            manager.close()
+        self._directory.cleanup()
+
+    def write_config(self, programs, name="config.yaml"):
+        return write_config(programs, self.directory, name)
+
+    def make_manager(self, programs, **kwargs):
+        manager = ProcessManager(self.write_config(programs), self.logger, **kwargs)
+        self.managers.append(manager)
+        return manager
@@ -0,0 +1,36 @@
+import contextlib
+import io
+import unittest
+
+from server.logger import Logger
+
+
+class Formatted:
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return "formatted"
+
+
+class DisabledLevelTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = Logger("TaskMasterTestLevels", log_file=None, log_level="INFO")
+        self.logger.console_enabled = True
+
+    def test_foreground_skips_disabled_levels(self):
+        argument = Formatted()
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            self.logger.debug("Value %s", argument)
+            self.logger.info("Shown")
+        self.assertEqual(argument.calls, 0)
+        self.assertNotIn("formatted", stdout.getvalue())
+        self.assertIn("Shown", stdout.getvalue())
+
+    def test_captured_command_skips_disabled_levels(self):
+        argument = Formatted()
+        with self.logger.console.capture() as buffer:
+            self.logger.debug("Value %s", argument)
+        self.assertEqual(argument.calls, 0)
+        self.assertEqual(buffer.getvalue(), "")
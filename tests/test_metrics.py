@@ -0,0 +1,20 @@
+import unittest
+
+from server.metrics import Counter, Histogram, Metrics
+
+
+class RenderTest(unittest.TestCase):
+    def test_liveness_kills_are_rendered(self):
+        metrics = Metrics()
+        metrics.liveness_kills.inc("web")
+        self.assertIn(
+            'taskmaster_liveness_kills_total{program="web"} 1', metrics.render()
+        )
+
+    def test_every_series_is_rendered(self):
+        metrics = Metrics()
+        output = metrics.render()
+        for metric in vars(metrics).values():
+            if isinstance(metric, (Counter, Histogram)):
+                with self.subTest(metric=metric.name):
+                    self.assertIn(f"# TYPE {metric.name} ", output)
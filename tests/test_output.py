@@ -0,0 +1,110 @@
+import gc
+import os
+
+from benchmarks.common import wait_for
+from server.process import RUNNING
+from tests.support import ManagerTestCase, make_program
+
+
+def open_fds():
+    # Managers of earlier tests may still be collected, so only count what a
+    # capture holds: pipes and output files
+    count = 0
+    for fd in os.listdir("/proc/self/fd"):
+        try:
+            target = os.readlink(f"/proc/self/fd/{fd}")
+        except OSError:
+            continue
+        if target.startswith("pipe:") or target.endswith(".log"):
+            count += 1
+    return count
+
+
+class CaptureCloseTest(ManagerTestCase):
+    def captured_program(self, numprocs):
+        return make_program(
+            "sleep 1000",
+            numprocs=numprocs,
+            autostart=True,
+            capture=True,
+            stdout=os.path.join(self.directory, "out.log"),
+            stdout_maxbytes=1024,
+            stdout_backups=1,
+        )
+
+    def wait_running(self, manager, count):
+        wait_for(
+            lambda: len(manager.processes["captured"]) == count
+            and all(
+                process_controller.state == RUNNING
+                for process_controller in manager.processes["captured"]
+            )
+        )
+
+    def test_scale_down_releases_captures(self):
+        manager = self.make_manager({"captured": self.captured_program(1)})
+        self.wait_running(manager, 1)
+        gc.collect()
+        baseline = open_fds()
+
+        manager.reload_configuration(
+            self.write_config({"captured": self.captured_program(4)}, "up.yaml")
+        )
+        self.wait_running(manager, 4)
+        self.assertGreater(open_fds(), baseline)
+
+        manager.reload_configuration(
+            self.write_config({"captured": self.captured_program(1)}, "down.yaml")
+        )
+        self.wait_running(manager, 1)
+        # The pipes of the stopped instances are closed at end of file
+        wait_for(lambda: open_fds() == baseline)
+
+    def test_removed_program_releases_captures(self):
+        manager = self.make_manager(
+            {"captured": self.captured_program(2), "other": make_program("true")}
+        )
+        self.wait_running(manager, 2)
+        removed = manager.processes["captured"]
+
+        manager.reload_configuration(
+            self.write_config({"other": make_program("true")}, "removed.yaml")
+        )
+
+        wait_for(
+            lambda: all(
+                process_controller.captures is None
+                for process_controller in removed
+            )
+        )
+
+
+class SharedRotationTest(ManagerTestCase):
+    def test_instances_rotate_their_shared_file_once(self):
+        path = os.path.join(self.directory, "out.log")
+        # 11 bytes a line, 2200 bytes an instance
+        manager = self.make_manager(
+            {
+                "writer": make_program(
+                    "sh -c 'for i in $(seq 200); do echo 0123456789; done; exec sleep 1000'",
+                    numprocs=3,
+                    autostart=True,
+                    stdout=path,
+                    stdout_maxbytes=1000,
+                    stdout_backups=2,
+                )
+            }
+        )
+        controllers = manager.processes["writer"]
+        wait_for(
+            lambda: all(
+                process_controller.captures is not None
+                and process_controller.captures["stdout"].buffer.total == 2200
+                for process_controller in controllers
+            )
+        )
+        # The full history is kept: both backups are full, not a third each
+        self.assertEqual(os.path.getsize(f"{path}.1"), 1000)
+        self.assertEqual(os.path.getsize(f"{path}.2"), 1000)
+        self.assertLessEqual(os.path.getsize(path), 1000)
+        self.assertFalse(os.path.exists(f"{path}.3"))
@@ -0,0 +1,27 @@
+import os
+
+from benchmarks.common import wait_for
+from server.process import RUNNING
+from tests.support import ManagerTestCase, make_program
+
+
+class LivenessTest(ManagerTestCase):
+    def test_hung_instance_is_restarted_under_autorestart_never(self):
+        manager = self.make_manager(
+            {
+                "hung": make_program(
+                    "sh -c 'touch alive; exec sleep 1000'",
+                    workingdir=self.directory,
+                    autorestart="never",
+                    liveness={"file": "alive", "interval": 0.05, "failures": 1},
+                )
+            }
+        )
+        controller = manager.processes["hung"][0]
+        self.assertTrue(controller.start().result(timeout=10))
+        pid = controller.process.pid
+        wait_for(lambda: os.path.exists(os.path.join(self.directory, "alive")))
+
+        os.unlink(os.path.join(self.directory, "alive"))
+
+        wait_for(lambda: controller.process.pid != pid and controller.state == RUNNING)
@@ -0,0 +1,48 @@
+import os
+import signal
+import time
+
+from benchmarks.common import wait_for
+from server.process import BACKOFF, RUNNING, STOPPED
+from tests.support import ManagerTestCase, make_program
+
+
+class StopAllTest(ManagerTestCase):
+    def test_stop_all_cancels_a_failed_start_retry(self):
+        manager = self.make_manager(
+            {"failing": make_program("false", startretries=3, backoff=1)}
+        )
+        controller = manager.processes["failing"][0]
+        start = controller.start()
+        wait_for(lambda: controller.state == BACKOFF)
+
+        manager.stop_all()
+
+        self.assertFalse(start.result(timeout=5))
+        # The retry was due within a second
+        time.sleep(1.5)
+        self.assertEqual(controller.state, STOPPED)
+        self.assertEqual(controller.attempt, 1)
+
+    def test_stop_all_cancels_a_pending_restart(self):
+        manager = self.make_manager(
+            {"crashing": make_program("sleep 1000", backoff=1, autostart=True)}
+        )
+        controller = manager.processes["crashing"][0]
+        wait_for(lambda: controller.state == RUNNING)
+        # The first crash restarts at once, the second waits for the backoff
+        for _ in range(2):
+            wait_for(lambda: controller.state == RUNNING)
+            pid = controller.process.pid
+            os.kill(pid, signal.SIGKILL)
+            wait_for(
+                lambda: controller.process.pid != pid or controller.state == BACKOFF
+            )
+        wait_for(lambda: controller.state == BACKOFF)
+
+        manager.stop_all()
+
+        time.sleep(1.5)
+        self.assertEqual(controller.state, STOPPED)
+        self.assertEqual(controller.process.pid, pid)
+        self.assertFalse(controller.is_active())
@@ -0,0 +1,73 @@
+import os
+import stat
+import subprocess
+import sys
+import threading
+
+from benchmarks.common import wait_for
+from server.server import TaskMasterServer
+from tests.support import ManagerTestCase, make_program
+
+
+class ClientExitCodeTest(ManagerTestCase):
+    def setUp(self):
+        super().setUp()
+        manager = self.make_manager({"sleeper": make_program("sleep 1000")})
+        self.socket_path = os.path.join(self.directory, "taskmaster.sock")
+        self.umask = os.umask(0o022)
+        os.umask(self.umask)
+        self.server = TaskMasterServer(
+            manager, self.logger, port=None, socket_path=self.socket_path
+        )
+        self.thread = threading.Thread(target=self.server.start)
+        self.thread.start()
+        wait_for(lambda: os.path.exists(self.socket_path))
+
+    def tearDown(self):
+        self.server.stop()
+        self.thread.join(timeout=5)
+        super().tearDown()
+
+    def run_client(self, *args):
+        return subprocess.run(
+            [sys.executable, "-m", "client.client", "--socket", self.socket_path]
+            + list(args),
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+
+    def test_socket_mode_without_changing_the_umask(self):
+        mode = stat.S_IMODE(os.stat(self.socket_path).st_mode)
+        self.assertEqual(mode, 0o600)
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.assertEqual(umask, self.umask)
+
+    def test_unknown_program_exits_nonzero(self):
+        for command in ("start", "stop", "restart"):
+            with self.subTest(command=command):
+                completed = self.run_client(command, "nope")
+                self.assertEqual(completed.returncode, 1)
+                self.assertIn("not found", completed.stdout)
+
+    def test_unknown_command_exits_nonzero(self):
+        completed = self.run_client("bogus")
+        self.assertEqual(completed.returncode, 1)
+        self.assertIn("Unknown command", completed.stdout)
+
+    def test_successful_command_exits_zero_without_colors(self):
+        completed = self.run_client("start", "sleeper")
+        self.assertEqual(completed.returncode, 0)
+        self.assertNotIn("\x1b[", completed.stdout)
+
+    def test_json_output_has_no_colors(self):
+        completed = self.run_client("--json", "stop", "nope")
+        self.assertEqual(completed.returncode, 1)
+        self.assertNotIn("\\u001b", completed.stdout)
+
+    def test_status_is_shown_below_the_log_level(self):
+        # The test logger only shows CRITICAL records
+        completed = self.run_client("status")
+        self.assertEqual(completed.returncode, 0)
+        self.assertIn("sleeper", completed.stdout)
@@ -0,0 +1,106 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from unittest import mock
+
+from benchmarks.common import wait_for
+from server.process import FATAL, RUNNING, STOPPED
+from server.zygote import ZygoteProcess
+from tests.support import ManagerTestCase, make_program
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as children_file:
+        return {int(child) for child in children_file.read().split()}
+
+
+class ZygoteTest(ManagerTestCase):
+    def setUp(self):
+        super().setUp()
+        script = os.path.join(self.directory, "worker.py")
+        with open(script, "w") as worker:
+            worker.write("import time\ntime.sleep(1000)\n")
+        self.manager = self.make_manager(
+            {
+                "worker": make_program(
+                    f"{sys.executable} {script}",
+                    numprocs=2,
+                    zygote=True,
+                    workingdir=self.directory,
+                )
+            }
+        )
+        self.controllers = self.manager.processes["worker"]
+
+    def start_first(self):
+        self.assertTrue(self.controllers[0].start().result(timeout=10))
+        return self.manager.zygotes["worker"].process.pid
+
+    def test_instances_are_forked_and_restarted(self):
+        template = self.start_first()
+        controller = self.controllers[0]
+        self.assertIsInstance(controller.process, ZygoteProcess)
+        self.assertEqual(children(template), {controller.process.pid})
+
+        pid = controller.process.pid
+        os.kill(pid, signal.SIGKILL)
+        wait_for(lambda: controller.process.pid != pid and controller.state == RUNNING)
+        self.assertEqual(children(template), {controller.process.pid})
+
+    @mock.patch("server.zygote.FORK_TIMEOUT", 0.5)
+    def test_stopped_template_does_not_block_the_loop(self):
+        template = self.start_first()
+        os.kill(template, signal.SIGSTOP)
+        try:
+            start = self.controllers[1].start()
+            time.sleep(0.1)
+            begin = time.monotonic()
+            self.manager.event_loop.run_sync(lambda: None)
+            self.assertLess(time.monotonic() - begin, 0.1)
+            # The fork times out and the attempt fails
+            self.assertFalse(start.result(timeout=5))
+            self.assertEqual(self.controllers[1].state, FATAL)
+        finally:
+            os.kill(template, signal.SIGCONT)
+        # The late instance is killed once the template answers
+        first = self.controllers[0].process.pid
+        wait_for(lambda: children(template) == {first})
+
+    def test_stop_while_the_fork_is_pending(self):
+        template = self.start_first()
+        os.kill(template, signal.SIGSTOP)
+        try:
+            start = self.controllers[1].start()
+            time.sleep(0.1)
+            self.assertTrue(self.controllers[1].stop().result(timeout=2))
+            self.assertFalse(start.result(timeout=1))
+            self.assertEqual(self.controllers[1].state, STOPPED)
+        finally:
+            os.kill(template, signal.SIGCONT)
+        first = self.controllers[0].process.pid
+        wait_for(lambda: children(template) == {first})
+
+    def test_template_exit_with_a_child_already_gone(self):
+        template = self.start_first()
+        controller = self.controllers[0]
+        first = controller.process
+        zygote = self.manager.zygotes["worker"]
+        gone = subprocess.Popen(["true"])
+        gone.wait()
+        exits = []
+
+        def add_gone_child():
+            # A child whose start time could not be read, reported first
+            child = ZygoteProcess(gone.pid, None)
+            zygote.children = {
+                gone.pid: (child, lambda process, code: exits.append(code)),
+                **zygote.children,
+            }
+
+        self.manager.event_loop.run_sync(add_gone_child)
+        os.kill(template, signal.SIGKILL)
+        wait_for(lambda: first.returncode is not None)
+        self.assertEqual(exits, [-signal.SIGKILL])
+        self.assertEqual(first.returncode, -signal.SIGKILL)